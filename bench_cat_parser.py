@@ -0,0 +1,114 @@
+""" Fuzzes CATParser against random TCP segmentation and measures its throughput.
+
+The fuzz pass feeds random frames (replies, auto-information pushes, '?;' rejections,
+stray whitespace) split at random byte boundaries and checks that exactly the same
+frames come out. The throughput pass compares CATParser with the previous approach of
+decoding each read and splitting the string:
+
+    python bench_cat_parser.py
+    python bench_cat_parser.py --frames 500000 --fuzz-rounds 2000 --seed 7
+"""
+import argparse
+import random
+import time
+
+from cat_parser import CATParser, parse_frame
+
+PREFIXES = ["ZZFA", "ZZFB", "ZZAC", "ZZBS", "ZZTX", "ZZTU", "ZZFL", "ZZFH", "ZZIT", "ZZLA", "ZZSM", "ZZRM"]
+
+
+def random_frame(rng):
+    """ Returns (wire text, expected frame text) for one random frame. """
+    roll = rng.random()
+    if roll < 0.05:
+        return "?;", "?"
+    prefix = rng.choice(PREFIXES)
+    if roll < 0.3:
+        value = f"{rng.choice('+-')}{rng.randrange(10000):04d}"
+    elif roll < 0.6:
+        value = f"{rng.randrange(100_000_000_000):011d}"
+    else:
+        value = str(rng.randrange(1000))
+    text = prefix + value
+    padding = "\n" if rng.random() < 0.1 else ""
+    return f"{padding}{text};{padding}", text
+
+
+def fuzz(rounds, rng):
+    for round_number in range(rounds):
+        frames = [random_frame(rng) for _ in range(rng.randrange(1, 60))]
+        stream = "".join(wire for wire, _ in frames).encode()
+        expected = [text for _, text in frames]
+
+        parser = CATParser()
+        got = []
+        position = 0
+        while position < len(stream):
+            size = rng.choice((1, 1, 2, 3, 7, rng.randrange(1, 64), len(stream)))
+            got.extend(frame.text for frame in parser.feed(stream[position:position + size]))
+            position += size
+        # Whitespace after the last ';' stays buffered until the next frame strips it
+        if got != expected or parser.buffer.strip():
+            raise AssertionError(f"round {round_number}: expected {expected}, got {got}, left {bytes(parser.buffer)}")
+        for frame_text in expected:
+            frame = parse_frame(frame_text)
+            value = frame.value
+            if frame.number is not None and int(value) != frame.number:
+                raise AssertionError(f"round {round_number}: {frame_text} parsed as {frame.number}")
+    print(f"fuzz: {rounds} rounds of randomly segmented streams parsed correctly")
+
+
+def make_reads(frames, read_size, rng):
+    stream = "".join(random_frame(rng)[0] for _ in range(frames)).encode()
+    return [stream[i:i + read_size] for i in range(0, len(stream), read_size)], len(stream)
+
+
+def naive_parse(reads):
+    """ decode + split per read, carrying the partial tail as a string. """
+    count = 0
+    tail = ""
+    for data in reads:
+        parts = (tail + data.decode("utf-8", "replace")).split(";")
+        tail = parts.pop()
+        for part in parts:
+            part = part.strip()
+            if part:
+                parse_frame(part)
+                count += 1
+    return count
+
+
+def parser_parse(reads):
+    parser = CATParser()
+    count = 0
+    for data in reads:
+        count += len(parser.feed(data))
+    return count
+
+
+def throughput(frames, read_size, rng):
+    reads, size = make_reads(frames, read_size, rng)
+    for name, parse in (("str split", naive_parse), ("CATParser", parser_parse)):
+        start = time.perf_counter()
+        count = parse(reads)
+        elapsed = time.perf_counter() - start
+        print(f"{name:10} {count / elapsed:12,.0f} frames/s  {size / elapsed / 1e6:7.1f} MB/s  "
+              f"({count} frames, {read_size}-byte reads)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz and benchmark the CAT frame parser")
+    parser.add_argument("--frames", type=int, default=200_000)
+    parser.add_argument("--fuzz-rounds", type=int, default=500)
+    parser.add_argument("--read-size", type=int, nargs="+", default=[16, 4096])
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fuzz(args.fuzz_rounds, rng)
+    for read_size in args.read_size:
+        throughput(args.frames, read_size, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+""" End-to-end latency/throughput benchmark for the MIDI and media-key control paths.
+
+Drives synthetic MIDI messages through thetis-midi-map.py and synthetic key codes
+through vfo-aimos.py's dispatch_cmd against a local Thetis simulator, and measures the
+time from input event to bytes arriving on the CAT socket:
+
+    python bench_control_path.py --output bench_results.json --label my-branch
+    python bench_control_path.py --compare bench_results.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import threading
+import time
+
+import cat_command
+import step_accumulator
+from script_loader import load_script
+from thetis_sim import ThetisSimulator
+
+BURST_DETENT_GAP = 0.002  # Seconds between detents in the VFO burst scenarios
+PUSH_BURST_LATENCY = 0.005  # Minimum simulated Thetis delay for the pushes-enabled burst
+
+# Count every thread the scripts start while the benchmark runs
+_threads_started = 0
+_thread_start = threading.Thread.start
+
+
+def _counting_start(self, *args, **kwargs):
+    global _threads_started
+    _threads_started += 1
+    return _thread_start(self, *args, **kwargs)
+
+
+threading.Thread.start = _counting_start
+
+
+def percentile(samples, p):
+    if len(samples) < 2:
+        return samples[0] if samples else None
+    return statistics.quantiles(samples, n=100, method="inclusive")[p - 1]
+
+
+class Scenario:
+    """ Collects latency samples and resource counters for one benchmark case. """
+
+    def __init__(self, name, sim):
+        self.name = name
+        self.sim = sim
+        self.latencies = []
+        self.events = 0
+        self.checks = {}  # name -> bool, reported with the results
+
+    def __enter__(self):
+        self.threads_before = _threads_started
+        self.sockets_before = self.sim.connections_opened
+        self.commands_before = len(self.sim.received)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        self.commands = len(self.sim.received) - self.commands_before
+        self.threads = _threads_started - self.threads_before
+        self.sockets = self.sim.connections_opened - self.sockets_before
+
+    def measure(self, inject, expected_commands=1, timeout=2.0, match=None):
+        """ Runs inject() and records the time until the CAT server saw its command(s).
+
+        With `match`, waits for the first command match(command) accepts instead, so
+        reads the scripts issue along the way (e.g. a ZZFA refresh) are not counted.
+        """
+        before = len(self.sim.received)
+        start = time.monotonic()
+        inject()
+        self.events += 1
+        if match is None:
+            target = before + expected_commands
+            if self.sim.wait_for_commands(target, timeout):
+                self.latencies.append((self.sim.received[target - 1][0] - start) * 1000)
+            return
+        def matched():
+            return next((at for at, _, command in self.sim.received[before:] if match(command)), None)
+        with self.sim.received_cond:
+            if self.sim.received_cond.wait_for(matched, timeout):
+                self.latencies.append((matched() - start) * 1000)
+
+    def result(self):
+        return {
+            "events": self.events,
+            "cat_commands": self.commands,
+            "p50_ms": percentile(self.latencies, 50),
+            "p95_ms": percentile(self.latencies, 95),
+            "p99_ms": percentile(self.latencies, 99),
+            "events_per_s": self.events / self.elapsed if self.elapsed else None,
+            "commands_per_s": self.commands / self.elapsed if self.elapsed else None,
+            "threads_created": self.threads,
+            "sockets_opened": self.sockets,
+            **self.checks,
+        }
+
+
+def bench_midi(sim, iterations):
+    midi_map = load_script("thetis-midi-map.py")
+    cat_command.route_radios(sim.address)  # Including any [radios] from mappings.toml
+    # Raw [status, data1, data2] events, as python-rtmidi hands them to the callback
+    def inject(*message):
+        midi_map.on_midi_input((list(message), 0.0))
+    results = {}
+    # Leave the coalescer's rate window between knob events so each one is sent on its own
+    knob_gap = 1.5 / midi_map.KNOB_MAX_RATE_HZ
+
+    with Scenario("midi_knob_latency", sim) as s:
+        for i in range(iterations):
+            s.measure(lambda: inject(0xB0, 101, (i * 7) % 128))
+            time.sleep(knob_gap)
+    results[s.name] = s.result()
+
+    with Scenario("midi_pad_latency", sim) as s:
+        for i in range(iterations):
+            s.measure(lambda: inject(0x90 if i % 2 == 0 else 0x80, 25, 100))
+    results[s.name] = s.result()
+
+    time.sleep(knob_gap)
+    with Scenario("midi_knob_sweep", sim) as s:
+        final = midi_map.knob_to_cat(102, 0).rstrip(";")
+        for _ in range(max(1, iterations // 128)):
+            for value in list(range(128)) + list(range(127, -1, -1)):
+                inject(0xB0, 102, value)
+                s.events += 1
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline and (not sim.received or sim.received[-1][2] != final):
+            time.sleep(0.001)
+    results[s.name] = s.result()
+    return results
+
+
+def bench_keys(sim, iterations):
+    vfo = load_script("vfo-aimos.py")
+    cat_command.route_radios(sim.address)  # Including any [radios] from mappings.toml
+    # The overlay is a separate GUI process; keep it out of the measured path
+    vfo.show_overlay = lambda message: None
+    results = {}
+
+    with Scenario("key_step_tune_latency", sim) as s:
+        for i in range(iterations):
+            s.measure(lambda: vfo.dispatch_cmd(177 if i % 2 == 0 else 176))
+    results[s.name] = s.result()
+
+    # Detents closer together than the accumulator window fold into one write (and an
+    # up/down pair cancels out), so leave the window between them to time each one
+    detent_gap = 1.5 * vfo.VFO_ACCEL_WINDOW
+    with Scenario("key_vfo_step_latency", sim) as s:
+        for i in range(iterations):
+            s.measure(lambda: vfo.dispatch_cmd(175 if i % 2 == 0 else 174),
+                      match=lambda command: command.startswith("ZZFA") and len(command) > 4)
+            time.sleep(detent_gap)
+    results[s.name] = s.result()
+
+    results.update(bench_vfo_burst(sim, vfo, iterations, "key_vfo_step_burst"))
+
+    # Again with ZZAI pushes echoing every write back into the radio-state mirror
+    vfo.radio_state.start()
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and not vfo.radio_state.following_pushes:
+        time.sleep(0.01)
+    # Pushes of earlier writes only arrive late enough to race the next window with some latency
+    latency, sim.latency = sim.latency, max(sim.latency, PUSH_BURST_LATENCY)
+    results.update(bench_vfo_burst(sim, vfo, iterations, "key_vfo_step_burst_pushes"))
+    sim.latency = latency
+    return results
+
+
+def bench_vfo_burst(sim, vfo, iterations, name):
+    # The burst folds into a few absolute ZZFA writes; a flat acceleration curve makes
+    # the end frequency independent of the spin rate, so the last write can be checked
+    vfo.vfo_a_steps.curve = ((0, 1),)
+    vfo.step_has_changed = False
+    time.sleep(step_accumulator.IDLE_RESET * 2)
+    expected = f"{int(sim.state['ZZFA']) + iterations * vfo.get_current_tune_step():011d}"
+    with Scenario(name, sim) as s:
+        # About 500 detents/s, so the spin spans several accumulator windows
+        for _ in range(iterations):
+            vfo.dispatch_cmd(175)
+            s.events += 1
+            time.sleep(BURST_DETENT_GAP)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and sim.state["ZZFA"] != expected:
+            time.sleep(0.001)
+    time.sleep(step_accumulator.IDLE_RESET)  # A late write would move it off again
+    s.checks["final_frequency_ok"] = sim.state["ZZFA"] == expected
+    vfo.vfo_a_steps.curve = vfo.VFO_ACCELERATION_CURVE
+    return {s.name: s.result()}
+
+
+def compare(current, baseline):
+    print(f"\nComparison against {baseline.get('label')}:")
+    for name, result in current["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if not old:
+            continue
+        for metric in ("p50_ms", "p99_ms", "events_per_s", "commands_per_s", "threads_created", "sockets_opened"):
+            if result[metric] is None or old.get(metric) in (None, 0):
+                continue
+            change = (result[metric] - old[metric]) / old[metric] * 100
+            print(f"  {name:24} {metric:16} {old[metric]:10.2f} -> {result[metric]:10.2f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MIDI/key to CAT control path")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated Thetis processing delay")
+    parser.add_argument("--skip-midi", action="store_true")
+    parser.add_argument("--skip-keys", action="store_true")
+    parser.add_argument("--label", default="current", help="Name stored with the results (e.g. git revision)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Previous JSON results to compare against")
+    args = parser.parse_args()
+
+    sim = ThetisSimulator(latency=args.latency_ms / 1000)
+    cat_command.THETIS_IP, cat_command.THETIS_PORT = sim.start()
+
+    scenarios = {}
+    if not args.skip_midi:
+        scenarios.update(bench_midi(sim, args.iterations))
+    if not args.skip_keys:
+        scenarios.update(bench_keys(sim, args.iterations))
+    sim.stop()
+
+    report = {
+        "label": args.label,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "iterations": args.iterations,
+        "simulated_latency_ms": args.latency_ms,
+        "scenarios": scenarios,
+    }
+    for name, result in scenarios.items():
+        p50, p99 = result["p50_ms"], result["p99_ms"]
+        latency = f"p50 {p50:7.2f} ms  p99 {p99:7.2f} ms" if p50 is not None else " " * 30
+        failed = [check for check, ok in result.items() if ok is False]
+        print(f"{name:24} {latency}  {result['commands_per_s']:9.1f} cmd/s  "
+              f"threads {result['threads_created']:4}  sockets {result['sockets_opened']:3}"
+              + (f"  FAILED {', '.join(failed)}" if failed else ""))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+""" Measures the time OverlayManager takes to render one overlay message.
+
+Compares the current update_text with the previous implementation, which re-applied the
+style sheet, window flags and opacity on every message:
+
+    python bench_overlay_render.py --messages 500
+    QT_QPA_PLATFORM=offscreen python bench_overlay_render.py
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QApplication
+
+import overlay_gui
+from overlay_gui import OVERLAY_STYLE, OverlayManager, position_overlay
+
+MESSAGES = ["Step tune 1Hz", "Step tune 10Hz", "Step tune 100Hz", "Step tune 1KHz"]
+
+
+def legacy_update_text(manager, message):
+    """ update_text as it was before the window was configured only once. """
+    manager.overlay.setStyleSheet(OVERLAY_STYLE)
+    manager.overlay.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.WindowStaysOnTopHint | Qt.WindowType.Tool)
+    manager.overlay.setWindowOpacity(0.8)
+    position_overlay(manager.overlay)
+    manager.overlay.setText(message)
+    manager.overlay.show()
+    manager.hide_timer.start(4000)
+
+
+def run(app, manager, update, messages, repeat_same):
+    samples = []
+    for i in range(messages):
+        message = MESSAGES[0] if repeat_same else MESSAGES[i % len(MESSAGES)]
+        start = time.perf_counter()
+        update(message)
+        app.processEvents()  # Include the native window work triggered by the update
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def report(name, samples):
+    quantiles = statistics.quantiles(samples, n=100, method="inclusive")
+    print(f"{name:34} mean {statistics.fmean(samples):9.1f} us  p50 {quantiles[49]:9.1f} us  "
+          f"p99 {quantiles[98]:9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark overlay render time per message")
+    parser.add_argument("--messages", type=int, default=500)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    # Pretend Thetis was found so window lookup is not part of the measurement
+    overlay_gui.window_cache.geometry = (0, 0, 1920, 1080)
+    overlay_gui.window_cache.last_scan = time.monotonic()
+
+    manager = OverlayManager()
+    for repeat_same in (False, True):
+        suffix = "same text" if repeat_same else "changing text"
+        report(f"before ({suffix})", run(app, manager, lambda m: legacy_update_text(manager, m),
+                                         args.messages, repeat_same))
+        report(f"after ({suffix})", run(app, manager, manager.update_text, args.messages, repeat_same))
+
+
+if __name__ == "__main__":
+    main()
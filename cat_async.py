@@ -0,0 +1,215 @@
+import asyncio
+import socket
+import threading
+from collections import defaultdict, deque
+
+import cat_command
+from cat_command import cat_prefix
+from cat_parser import READ_SIZE, CATParser
+
+
+class AsyncCATClient:
+    """ Pipelined asyncio CAT client.
+
+    Any number of queries can be in flight on the single socket. Replies are matched
+    back to the oldest waiter whose query they start with (ZZRM5 and ZZRM8 are told
+    apart, not just their ZZRM prefix), so a batch of queries costs one write and one
+    pass over the replies instead of N round trips. Thetis answers in order, so a '?;'
+    rejection resolves the oldest outstanding query to None. Frames nobody is waiting
+    for (e.g. ZZAI auto-information) go to on_unsolicited.
+    """
+
+    def __init__(self, host=None, port=None, timeout=None, on_unsolicited=None):
+        self.host = host or cat_command.THETIS_IP
+        self.port = port or cat_command.THETIS_PORT
+        self.timeout = timeout or cat_command.CAT_TIMEOUT
+        self.on_unsolicited = on_unsolicited
+        self.reader = None
+        self.writer = None
+        self.read_task = None
+        self.pending = defaultdict(deque)  # prefix -> (query text, future), oldest first
+        self.outstanding = deque()  # Every pending future in the order it was written
+        self.connect_lock = None
+
+    @property
+    def connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def connect(self):
+        if self.connect_lock is None:
+            self.connect_lock = asyncio.Lock()
+        async with self.connect_lock:
+            if self.connected:
+                return
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout)
+            sock = self.writer.get_extra_info("socket")
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.read_task = asyncio.create_task(self._read_loop())
+
+    async def close(self):
+        if self.read_task:
+            self.read_task.cancel()
+            self.read_task = None
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+        self._fail_pending(ConnectionError("CAT client closed"))
+
+    def _fail_pending(self, exc):
+        for waiters in self.pending.values():
+            for _, future in waiters:
+                if not future.done():
+                    future.set_exception(exc)
+        self.pending.clear()
+        self.outstanding.clear()
+
+    async def _read_loop(self):
+        parser = CATParser()
+        try:
+            while True:
+                # One read hands over every frame that has arrived, split or batched
+                data = await self.reader.read(READ_SIZE)
+                if not data:
+                    raise ConnectionResetError("CAT server closed the connection")
+                for frame in parser.feed(data):
+                    try:
+                        self._dispatch(frame)
+                    except Exception as e:
+                        # A failing listener must not end the read task and strand every query
+                        print(f"❌ CAT listener error: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.writer:
+                self.writer.close()
+                self.writer = None
+            self._fail_pending(ConnectionError(f"CAT connection lost: {e}"))
+
+    def _dispatch(self, frame):
+        if frame.rejected:
+            self._reject_oldest()
+            return
+        reply = frame.text
+        # Replies and pushes also invalidate what the sync connection to this radio last sent
+        cat_command.note_reported(reply, self.host, self.port)
+        waiters = self.pending.get(frame.prefix)
+        if waiters:
+            selector = reply.upper()
+            for entry in waiters:
+                query, future = entry
+                if not future.done() and selector.startswith(query):
+                    waiters.remove(entry)
+                    future.set_result(reply)
+                    return
+        if self.on_unsolicited:
+            self.on_unsolicited(reply)
+
+    def _reject_oldest(self):
+        while self.outstanding:
+            future = self.outstanding.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+
+    @staticmethod
+    def _selector(command):
+        """ The text a reply to this query starts with, e.g. "ZZRM5" for "zzrm5;". """
+        return command.strip().rstrip(";").upper()
+
+    @staticmethod
+    def _encode(commands):
+        return "".join(f"{command.strip().rstrip(';')};" for command in commands).encode()
+
+    async def send(self, *commands):
+        """ Writes one or more set commands in a single write. """
+        await self.connect()
+        self.writer.write(self._encode(commands))
+        await self.writer.drain()
+
+    async def query_many(self, commands):
+        """ Sends all queries in one write and returns their replies in order.
+
+        A query Thetis rejects with '?;', or whose reply does not arrive within the
+        timeout, yields None without failing the rest of the batch.
+        """
+        await self.connect()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for command in commands:
+            future = loop.create_future()
+            self.pending[cat_prefix(command)].append((self._selector(command), future))
+            self.outstanding.append(future)
+            futures.append(future)
+        self.writer.write(self._encode(commands))
+        try:
+            await self.writer.drain()
+            await asyncio.wait(futures, timeout=self.timeout)
+            return [future.result() if future.done() and not future.exception() else None
+                    for future in futures]
+        finally:
+            for command, future in zip(commands, futures):
+                waiters = self.pending.get(cat_prefix(command))
+                entry = (self._selector(command), future)
+                if waiters and entry in waiters:
+                    waiters.remove(entry)
+                if future in self.outstanding:
+                    self.outstanding.remove(future)
+
+    async def query(self, command):
+        """ Sends a single query and waits for its reply. """
+        return (await self.query_many([command]))[0]
+
+
+class CATClientThread:
+    """ Runs an AsyncCATClient on a background event loop for synchronous callers. """
+
+    def __init__(self, host=None, port=None, timeout=None, on_unsolicited=None):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.client = AsyncCATClient(host, port, timeout, on_unsolicited)
+
+    def _run(self, coro):
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result(self.client.timeout + 1)
+
+    def send(self, *commands):
+        return self._run(self.client.send(*commands))
+
+    def query(self, command):
+        return self._run(self.client.query(command))
+
+    def query_many(self, commands):
+        return self._run(self.client.query_many(commands))
+
+    def close(self):
+        self._run(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+# Shared client for scripts that want pipelined queries without managing a loop
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = CATClientThread()
+        return _client
+
+
+def query_cat_many(commands):
+    """ Queries several CAT commands in one pipelined round trip.
+
+    Returns the replies in the same order and format as query_cat (without the
+    trailing ';'), with None for every reply that did not arrive.
+    """
+    try:
+        return get_client().query_many(commands)
+    except Exception as e:
+        print(f"❌ CAT Connection Error: {e}")
+        return [None] * len(commands)
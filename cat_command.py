@@ -1,28 +1,345 @@
 import socket
+import threading
+import time
+
+from cat_metrics import metrics
+from cat_parser import CATParser, parse_frame
 
 # Thetis CAT Server Settings (adjust accordingly)
 THETIS_IP = "127.0.0.1"  # Change to your Thetis CAT server IP
 THETIS_PORT = 13013  # Default CAT TCP/IP port
+CAT_TIMEOUT = 2  # Seconds to wait for connect/recv before giving up
+DEDUP_WINDOW = 1.0  # Seconds an identical set command counts as redundant (0 sends everything)
+# Absolute set commands whose exact repeats change nothing; never MOX/TUN or relative steps
+DEDUP_PREFIXES = frozenset({"ZZLA", "ZZLB", "ZZLC", "ZZLD", "ZZBS", "ZZAC", "ZZSW",
+                            "ZZFA", "ZZFB", "ZZFL", "ZZFH", "ZZIT"})
+# Settings a set command moves besides its own: a band change recalls the band stack's
+# frequencies and filter, and a frequency can cross into another band
+DEDUP_COUPLED = {
+    "ZZBS": ("ZZFA", "ZZFB", "ZZFL", "ZZFH", "ZZIT"),
+    "ZZFA": ("ZZBS",),
+    "ZZFB": ("ZZBS",),
+}
+
+DEFAULT_RADIO = "main"  # Name of the THETIS_IP/THETIS_PORT instance in RADIOS and mappings.toml
+# Other Thetis instances by name, e.g. {"rx2": ("192.168.1.20", 13013)}; mappings.toml can add more
+RADIOS = {}
+_configured_radios = dict(RADIOS)
+
+
+def radio_address(radio=None):
+    """ Returns (host, port) of a named radio; None is the default radio. """
+    if radio in RADIOS:
+        return RADIOS[radio]
+    if radio is None or radio == DEFAULT_RADIO:
+        return THETIS_IP, THETIS_PORT
+    raise ValueError(f"Unknown radio: {radio}")
+
+
+def radio_names(runtime=None):
+    """ Every radio name; `runtime` stands in for the radios currently added by set_radios. """
+    return {DEFAULT_RADIO, *_configured_radios, *(RADIOS if runtime is None else runtime)}
+
+
+def set_radios(radios):
+    """ Replaces the radios added at runtime (from mappings.toml); RADIOS above stays. """
+    global RADIOS
+    RADIOS = {**_configured_radios, **radios}
+
+
+def route_radios(address):
+    """ Points the default radio and every named radio at one (host, port), e.g. a
+    simulator, so tools driving the scripts never reach a real Thetis. """
+    global THETIS_IP, THETIS_PORT
+    THETIS_IP, THETIS_PORT = address
+    set_radios({name: address for name in radio_names()})
+
+
+def cat_prefix(command):
+    """ Returns the ZZxx prefix of a command or reply (used to match replies and label metrics). """
+    return command.strip().lstrip(';')[:4].upper()
+
+
+def command_value(command):
+    """ Returns the value a set command writes ("" for a bare query or action). """
+    return parse_frame(command.strip().rstrip(";")).value
+
+
+def encode_cat_command(command):
+    """ Encodes a CAT command into the bytes we put on the wire. """
+    return f"{command};\n".encode() + b'\n'
+
+
+class EncodedCommand(bytes):
+    """ A CAT command encoded once, ahead of time, for hot paths.
+
+    The bytes are exactly what send_cat_command would put on the wire; the original
+    text, prefix and value ride along for listeners, metrics and SentValues, and `radio`
+    (a name or tuple of names, None for the default radio) tells the dispatcher where it goes.
+    """
+
+    def __new__(cls, command, radio=None):
+        self = super().__new__(cls, encode_cat_command(command))
+        self.command = command
+        self.prefix = cat_prefix(command)
+        self.value = command_value(command)
+        self.radio = radio
+        return self
+
+    def __repr__(self):
+        return f"EncodedCommand({self.command!r})"
+
+
+class SentValues:
+    """ The last value written per CAT prefix on one connection.
+
+    redundant() is true for an exact repeat of a DEDUP_PREFIXES set command within
+    `window` seconds of being written. A set command forgets the settings it moves
+    (DEDUP_COUPLED); any other command we send (ZZSB, ZZTX1, ...) may move values we
+    cannot predict, so it forgets everything; so does a connection reset, and a reply or
+    push reporting a different value forgets that prefix.
+    """
+
+    def __init__(self, window=None):
+        self.window = window  # None follows DEDUP_WINDOW, including later changes to it
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def redundant(self, prefix, value):
+        window = DEDUP_WINDOW if self.window is None else self.window
+        if not window or prefix not in DEDUP_PREFIXES:
+            return False
+        with self.lock:
+            entry = self.values.get(prefix)
+        return (entry is not None and entry[0] == value
+                and time.monotonic() - entry[1] <= window)
+
+    def record(self, prefix, value):
+        """ Records a command written to Thetis (set commands are not acknowledged). """
+        with self.lock:
+            if prefix in DEDUP_PREFIXES and value:
+                for coupled in DEDUP_COUPLED.get(prefix, ()):
+                    self.values.pop(coupled, None)
+                self.values[prefix] = (value, time.monotonic())
+            else:
+                self.values.clear()
+
+    def observe(self, frames):
+        """ Forgets prefixes whose reported value differs from what we last sent. """
+        for text in frames.split(";"):
+            prefix, value = parse_frame(text.strip())
+            with self.lock:
+                entry = self.values.get(prefix)
+                if entry is not None and value and entry[0] != value:
+                    del self.values[prefix]
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class CATConnection:
+    """ Long-lived TCP connection to a Thetis CAT server.
+
+    The socket is opened lazily, kept open between commands and transparently
+    re-opened (once) when a send or receive fails. All socket access goes through
+    a lock so the connection can be shared between threads.
+    """
+
+    def __init__(self, host, port, timeout=CAT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.parser = CATParser()
+        self.sent = SentValues()
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        return sock
+
+    def _close(self):
+        # A new connection may be talking to a restarted Thetis; nothing sent is known to hold
+        self.sent.clear()
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def _drain(self, sock):
+        """ Discards any stale bytes (e.g. replies to earlier commands) left in the socket. """
+        self.parser.reset()
+        sock.setblocking(False)
+        try:
+            while True:
+                if not sock.recv(4096):
+                    raise ConnectionResetError("CAT server closed the connection")
+        except BlockingIOError:
+            pass
+        finally:
+            sock.settimeout(self.timeout)
+
+    def _exchange(self, payload, expect_reply):
+        sock = self.sock or self._connect()
+        self._drain(sock)
+        sock.sendall(payload)
+        if expect_reply:
+            # Reads until the reply arrives, however TCP splits it; other frames sharing the
+            # stream (e.g. auto-information pushes) are skipped, as _drain would have done
+            deadline = time.monotonic() + self.timeout
+            while time.monotonic() < deadline:
+                for frame in self.parser.read_from(sock):
+                    if frame.prefix == expect_reply or frame.rejected:
+                        return frame
+            raise TimeoutError(f"No {expect_reply} reply from the CAT server")
+
+    def request(self, payload, expect_reply=None):
+        """ Sends an encoded payload, reconnecting once if the connection went stale.
+
+        With expect_reply set to a ZZxx prefix, returns the CATFrame answering it.
+        """
+        with self.lock:
+            return self._request(payload, expect_reply)
+
+    def send(self, payload, prefix, value):
+        """ Sends a command unless SentValues finds it redundant; returns False if skipped.
+
+        The check, the write and the record happen under the connection lock, so two
+        threads sending the same value cannot both pass the check.
+        """
+        with self.lock:
+            if self.sent.redundant(prefix, value):
+                return False
+            self._request(payload)
+            self.sent.record(prefix, value)
+            return True
+
+    def _request(self, payload, expect_reply=None):
+        try:
+            return self._exchange(payload, expect_reply)
+        except (ConnectionError, BrokenPipeError):
+            self._close()
+            metrics.inc("cat_reconnects_total", f"{self.host}:{self.port}")
+            return self._exchange(payload, expect_reply)
+        except Exception:
+            self._close()
+            raise
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+
+# One connection per (host, port), shared by every caller in the process
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def get_connection(host=None, port=None):
+    """ Returns the pooled connection for host/port (defaults to THETIS_IP/THETIS_PORT). """
+    key = (host or THETIS_IP, port or THETIS_PORT)
+    with _connections_lock:
+        conn = _connections.get(key)
+        if conn is None:
+            conn = _connections[key] = CATConnection(*key)
+        return conn
+
+
+def close_connections():
+    """ Closes every pooled CAT connection. """
+    with _connections_lock:
+        for conn in _connections.values():
+            conn.close()
+        _connections.clear()
+
+
+# Callbacks notified of every command sent and every reply received (e.g. radio_state)
+_send_listeners = []
+_reply_listeners = []
+
+
+def add_send_listener(callback):
+    """ Registers callback(command), called after a command was written to Thetis. """
+    _send_listeners.append(callback)
+
+
+def add_reply_listener(callback):
+    """ Registers callback(reply), called with every query_cat reply. """
+    _reply_listeners.append(callback)
+
+
+def _notify(listeners, value):
+    for callback in listeners:
+        try:
+            callback(value)
+        except Exception as e:
+            print(f"❌ CAT listener error: {e}")
+
+
+def note_reported(frames, host=None, port=None):
+    """ Tells the connection to host/port what Thetis reported, e.g. via auto-information. """
+    get_connection(host, port).sent.observe(frames)
+
+
+def _record_error(prefix, e):
+    metrics.inc("cat_errors_total", "timeout" if isinstance(e, TimeoutError) else type(e).__name__)
+    metrics.inc("cat_failed_total", prefix)
+
+
+def _is_default(radio):
+    return radio is None or radio == DEFAULT_RADIO
+
+
+def send_cat_command(command, radio=None):
+    """ Sends a CAT command (text or EncodedCommand) to one Thetis instance over TCP.
 
-def send_cat_command(command):
-    """ Sends a CAT command to Thetis over TCP. """
+    An exact repeat of the set command last sent to that instance is skipped (see SentValues).
+    """
+    if isinstance(command, EncodedCommand):
+        payload, prefix, value, command = command, command.prefix, command.value, command.command
+    else:
+        payload, prefix, value = encode_cat_command(command), cat_prefix(command), command_value(command)
+    start = time.perf_counter()
     try:
-        with socket.create_connection((THETIS_IP, THETIS_PORT), timeout=2) as sock:
-            c = f"{command};\n"
-            sock.sendall(c.encode() + b'\n')
-            # print(f"✅ Sent: {command} | Response: {response}")
+        if not get_connection(*radio_address(radio)).send(payload, prefix, value):
+            metrics.inc("cat_suppressed_total", prefix)
+            metrics.inc("cat_suppressed_bytes_total", prefix, len(payload))
             return
+        # print(f"✅ Sent: {command}")
+        elapsed = time.perf_counter() - start
+        metrics.observe("cat_send_seconds", elapsed, prefix)
+        metrics.inc("cat_commands_total", prefix)
+        metrics.observe("cat_radio_send_seconds", elapsed, radio or DEFAULT_RADIO)
+        if _is_default(radio):
+            # Listeners (radio_state) mirror the default radio only
+            _notify(_send_listeners, command)
+        return
     except Exception as e:
+        _record_error(prefix, e)
         print(f"❌ CAT Connection Error: {e}")
 
-def query_cat(command):
-    """ Sends a CAT command to Thetis over TCP. """
+def query_cat(command, radio=None):
+    """ Sends a CAT command to one Thetis instance over TCP and returns its reply. """
+    prefix = cat_prefix(command)
+    start = time.perf_counter()
     try:
-        with socket.create_connection((THETIS_IP, THETIS_PORT), timeout=2) as sock:
-            c = f"{command};\n"
-            sock.sendall(c.encode() + b'\n')
-            response = sock.recv(1024)
-            # print(f"✅ Sent: {command} | Response: {response}")
-            return response.decode('utf-8').strip(';')
+        conn = get_connection(*radio_address(radio))
+        frame = conn.request(encode_cat_command(command), expect_reply=prefix)
+        # print(f"✅ Sent: {command} | Response: {frame}")
+        if frame.rejected:
+            raise ValueError(f"Thetis rejected {command}")
+        metrics.observe("cat_query_seconds", time.perf_counter() - start, prefix)
+        metrics.inc("cat_commands_total", prefix)
+        reply = frame.text
+        conn.sent.observe(reply)
+        if _is_default(radio):
+            _notify(_reply_listeners, reply)
+        return reply
     except Exception as e:
+        _record_error(prefix, e)
         print(f"❌ CAT Connection Error: {e}")
@@ -0,0 +1,153 @@
+import functools
+import threading
+from collections import deque
+
+import cat_command
+from cat_metrics import metrics
+
+DISPATCH_QUEUE_SIZE = 256  # Commands waiting for the CAT link before the drop policy kicks in
+
+# What submit() does when the queue is full
+BLOCK = "block"                # Wait for room (never loses a command)
+DROP_NEWEST = "drop_newest"    # Discard the command being submitted
+DROP_OLDEST = "drop_oldest"    # Discard the oldest queued command to make room
+
+
+class CATDispatcher:
+    """ Single-worker, bounded, FIFO queue for outbound CAT commands.
+
+    Commands are written by one background thread in the order they were submitted,
+    so relative commands such as ZZSB;/ZZSA; reach Thetis in order and no thread is
+    created per command.
+    """
+
+    def __init__(self, send=None, maxsize=DISPATCH_QUEUE_SIZE, policy=DROP_OLDEST, name="cat-dispatcher"):
+        if policy not in (BLOCK, DROP_NEWEST, DROP_OLDEST):
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.send = send or cat_command.send_cat_command
+        self.maxsize = maxsize
+        self.policy = policy
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.in_flight = 0
+        self.submitted = 0
+        self.sent = 0
+        self.dropped = 0
+        self.running = True
+        self.name = name
+        metrics.register_gauge("queue_depth", self.__len__, name)
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        return len(self.queue)
+
+    def submit(self, command):
+        """ Queues a command, or a callable returning one (None sends nothing) to be called
+        on the worker; returns False if it was dropped. """
+        with self.cond:
+            if not self.running:
+                return False
+            self.submitted += 1
+            if len(self.queue) >= self.maxsize:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    metrics.inc("dropped_total", self.name)
+                    return False
+                if self.policy == DROP_OLDEST:
+                    self.queue.popleft()
+                    self.dropped += 1
+                    metrics.inc("dropped_total", self.name)
+                else:
+                    self.cond.wait_for(lambda: len(self.queue) < self.maxsize or not self.running)
+                    if not self.running:
+                        return False
+            self.queue.append(command)
+            self.cond.notify_all()
+            return True
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.queue or not self.running)
+                if not self.queue:
+                    return
+                command = self.queue.popleft()
+                self.in_flight += 1
+                self.cond.notify_all()
+            try:
+                if callable(command):
+                    # Deferred command: built on this worker, so any read it needs first
+                    # (e.g. the radio's current ZZAC) only ever holds up this radio
+                    command = command()
+                if command is not None:
+                    self.send(command)
+                    self.sent += 1
+            except Exception as e:
+                print(f"❌ CAT dispatch error for {command}: {e}")
+            finally:
+                with self.cond:
+                    self.in_flight -= 1
+                    self.cond.notify_all()
+
+    def flush(self, timeout=None):
+        """ Waits until every queued command has been sent; returns False on timeout. """
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.queue and not self.in_flight, timeout)
+
+    def shutdown(self, flush=True, timeout=None):
+        """ Stops accepting commands and stops the worker, optionally after draining the queue. """
+        if flush:
+            self.flush(timeout)
+        with self.cond:
+            self.running = False
+            if not flush:
+                self.dropped += len(self.queue)
+                metrics.inc("dropped_total", self.name, len(self.queue))
+                self.queue.clear()
+            self.cond.notify_all()
+        self.thread.join(timeout)
+
+
+# One dispatcher (worker thread, queue and connection) per radio, shared by every script
+# in this interpreter, so a slow or unreachable radio only ever delays its own commands
+_dispatchers = {}
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher(radio=None):
+    radio = radio or cat_command.DEFAULT_RADIO
+    with _dispatcher_lock:
+        dispatcher = _dispatchers.get(radio)
+        if dispatcher is None:
+            if radio == cat_command.DEFAULT_RADIO:
+                dispatcher = CATDispatcher()
+            else:
+                cat_command.radio_address(radio)  # Unknown names raise here, not in the worker
+                dispatcher = CATDispatcher(send=functools.partial(cat_command.send_cat_command, radio=radio),
+                                           name=f"cat-dispatcher-{radio}")
+            _dispatchers[radio] = dispatcher
+        return dispatcher
+
+
+def dispatch_cat_command(command, radio=None):
+    """ Queues a CAT command for one radio, or for each radio in a tuple of names.
+
+    radio defaults to the EncodedCommand's own target, then to the default radio.
+    Returns False if any of the radios' dispatchers dropped the command.
+    """
+    radio = radio or getattr(command, "radio", None)
+    if radio is None or isinstance(radio, str):
+        return get_dispatcher(radio).submit(command)
+    accepted = True
+    for name in radio:
+        accepted = get_dispatcher(name).submit(command) and accepted
+    return accepted
+
+
+def shutdown_dispatchers(flush=True, timeout=None):
+    """ Shuts down every radio's dispatcher. """
+    with _dispatcher_lock:
+        dispatchers = list(_dispatchers.values())
+    for dispatcher in dispatchers:
+        dispatcher.shutdown(flush, timeout)
@@ -0,0 +1,198 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency histogram bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, float("inf"))
+
+SUMMARY_INTERVAL = 60  # Seconds between summary log lines
+METRICS_HOST = "127.0.0.1"  # Only expose the metrics endpoint locally
+
+
+class Histogram:
+    """ Fixed-bucket latency histogram; observe() is a bisect and two adds. """
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms):
+        self.counts[bisect.bisect_left(self.buckets, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def quantile(self, q):
+        """ Upper bound of the bucket holding the q-th quantile. """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, self.max), 3)
+        return round(self.max, 3)
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum_ms": round(self.total, 3),
+            "max_ms": round(self.max, 3),
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "buckets": dict(zip(map(str, self.buckets), self.counts)),
+        }
+
+
+class Metrics:
+    """ Process-wide counters, latency histograms and sampled gauges.
+
+    Every series is keyed by (name, label); label is usually the 4-letter CAT prefix
+    or a component name. Cheap enough to leave on permanently.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.started = time.time()
+        self.http_server = None
+
+    def inc(self, name, label=None, n=1):
+        key = (name, label)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def observe(self, name, seconds, label=None):
+        key = (name, label)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds * 1000)
+
+    def register_gauge(self, name, sample, label=None):
+        """ Registers a callable sampled whenever a snapshot is taken (e.g. a queue length). """
+        with self.lock:
+            self.gauges[(name, label)] = sample
+
+    def _sample_gauges(self):
+        values = {}
+        for key, sample in list(self.gauges.items()):
+            try:
+                values[key] = sample()
+            except Exception:
+                values[key] = None
+        return values
+
+    def snapshot(self):
+        gauges = self._sample_gauges()
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: h.snapshot() for key, h in self.histograms.items()}
+
+        def grouped(series):
+            result = {}
+            for (name, label), value in series.items():
+                result.setdefault(name, {})[label or ""] = value
+            return result
+
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "counters": grouped(counters),
+            "gauges": grouped(gauges),
+            "histograms": grouped(histograms),
+        }
+
+    def to_prometheus(self):
+        """ Renders the current values in the Prometheus text exposition format. """
+        gauges = self._sample_gauges()
+        lines = []
+
+        def labels(label, extra=""):
+            parts = ([f'label="{label}"'] if label else []) + ([extra] if extra else [])
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        with self.lock:
+            for (name, label), value in sorted(self.counters.items(), key=str):
+                lines.append(f"thetis_{name}{labels(label)} {value}")
+            for (name, label), histogram in sorted(self.histograms.items(), key=str):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound / 1000:g}"
+                    bucket_label = labels(label, f'le="{le}"')
+                    lines.append(f"thetis_{name}_bucket{bucket_label} {cumulative}")
+                lines.append(f"thetis_{name}_sum{labels(label)} {histogram.total / 1000:.6f}")
+                lines.append(f"thetis_{name}_count{labels(label)} {histogram.count}")
+        for (name, label), value in sorted(gauges.items(), key=str):
+            if value is not None:
+                lines.append(f"thetis_{name}{labels(label)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary_line(self):
+        """ One-line overview: totals, errors, slowest send/query prefixes and queue depths. """
+        snapshot = self.snapshot()
+        counters = snapshot["counters"]
+        parts = [f"cat_commands={sum(counters.get('cat_commands_total', {}).values())}",
+                 f"cat_errors={sum(counters.get('cat_errors_total', {}).values())}"]
+        for name in ("cat_send_seconds", "cat_query_seconds"):
+            series = snapshot["histograms"].get(name, {})
+            if series:
+                label, worst = max(series.items(), key=lambda item: item[1]["p99_ms"] or 0)
+                parts.append(f"{name}_p99_max={label}:{worst['p99_ms']}ms")
+        for name in ("dropped_total", "coalesced_total"):
+            for label, value in counters.get(name, {}).items():
+                parts.append(f"{name}[{label}]={value}")
+        for label, value in snapshot["gauges"].get("queue_depth", {}).items():
+            parts.append(f"queue_depth[{label}]={value}")
+        return "operation=metrics_summary, " + ", ".join(parts)
+
+    def start_summary_logger(self, interval=SUMMARY_INTERVAL, log=None):
+        """ Logs summary_line() every `interval` seconds from a daemon thread. """
+        log = log or logging.getLogger("cat_metrics").info
+
+        def run():
+            while True:
+                time.sleep(interval)
+                log(self.summary_line())
+
+        threading.Thread(target=run, name="metrics-summary", daemon=True).start()
+
+    def start_http_server(self, port, host=METRICS_HOST):
+        """ Serves /metrics (Prometheus text) and /metrics.json on a local port. """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+                elif self.path in ("/", "/metrics"):
+                    body, content_type = metrics.to_prometheus().encode(), "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.http_server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.http_server.serve_forever, name="metrics-http", daemon=True).start()
+        return self.http_server
+
+
+metrics = Metrics()
@@ -0,0 +1,72 @@
+from collections import namedtuple
+
+READ_SIZE = 4096  # Bytes requested per socket read
+MAX_BUFFER = 64 * 1024  # An unterminated frame longer than this is garbage; drop it
+
+
+class CATFrame(namedtuple("CATFrame", "prefix value")):
+    """ One ';'-terminated CAT frame: "ZZFA00014074000" -> prefix "ZZFA", value "00014074000". """
+
+    __slots__ = ()
+
+    @property
+    def text(self):
+        """ The frame as Thetis sent it, without the ';'. """
+        return self.prefix + self.value
+
+    @property
+    def number(self):
+        """ The value as an int ("+0100" -> 100, "-0050" -> -50), or None if it is not numeric. """
+        digits = self.value[1:] if self.value[:1] in ("+", "-") else self.value
+        return int(self.value) if digits.isdigit() else None
+
+    @property
+    def rejected(self):
+        """ Thetis answers "?;" to commands it does not accept. """
+        return self.prefix == "?"
+
+
+def parse_frame(text):
+    return CATFrame(text[:4].upper(), text[4:])
+
+
+class CATParser:
+    """ Incremental splitter for a CAT byte stream.
+
+    feed() accepts whatever a socket read returned - half a frame, several frames, a
+    reply followed by auto-information pushes - and returns every frame completed so far.
+    Bytes are appended to one bytearray and everything up to the last ';' is decoded and
+    split in a single pass, so a multi-byte character cut by a read is never mangled and
+    consumed bytes are removed once per feed() rather than once per frame.
+    """
+
+    def __init__(self, max_buffer=MAX_BUFFER):
+        self.buffer = bytearray()
+        self.max_buffer = max_buffer
+        self.chunk = bytearray(READ_SIZE)
+        self.overflows = 0
+
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        end = buffer.rfind(b";")
+        if end < 0:
+            if len(buffer) > self.max_buffer:
+                self.overflows += 1
+                buffer.clear()
+            return []
+        # Every complete frame is decoded and split in one pass; the tail waits for more bytes
+        text = buffer[:end].decode("utf-8", "replace")
+        del buffer[:end + 1]
+        return [parse_frame(part) for part in map(str.strip, text.split(";")) if part]
+
+    def read_from(self, sock):
+        """ Reads once from a blocking socket into a reused buffer and returns the new frames. """
+        count = sock.recv_into(self.chunk)
+        if not count:
+            raise ConnectionResetError("CAT server closed the connection")
+        with memoryview(self.chunk) as view:
+            return self.feed(view[:count])
+
+    def reset(self):
+        self.buffer.clear()
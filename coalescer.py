@@ -0,0 +1,75 @@
+import threading
+import time
+
+from cat_metrics import metrics
+
+
+class Coalescer:
+    """ Latest-value-wins rate limiter for continuous controls (knobs, sliders).
+
+    submit() only records the newest value for a key; a background thread hands it to
+    `send` at most `max_rate_hz` times per second per key. The first value after an idle
+    period goes out immediately, values arriving inside the interval overwrite each other
+    and only the last one is sent when the interval expires.
+    """
+
+    def __init__(self, send, max_rate_hz=50, name="coalescer"):
+        self.send = send
+        self.name = name
+        self.interval = 1.0 / max_rate_hz
+        self.pending = {}
+        self.next_allowed = {}
+        self.submitted = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.running = True
+        self.cond = threading.Condition()
+        metrics.register_gauge("queue_depth", self.pending.__len__, name)
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, key, value):
+        """ Records the newest value for key; older unsent values are discarded. """
+        with self.cond:
+            self.submitted += 1
+            if key in self.pending:
+                self.coalesced += 1
+                metrics.inc("coalesced_total", self.name)
+            self.pending[key] = value
+            self.cond.notify()
+
+    def _next_batch(self):
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                due = [key for key in self.pending if self.next_allowed.get(key, 0) <= now]
+                if due or not self.running:
+                    break
+                wait = min(self.next_allowed[key] for key in self.pending) - now if self.pending else None
+                self.cond.wait(wait)
+
+            if not self.running:
+                due = list(self.pending)
+            batch = [(key, self.pending.pop(key)) for key in due]
+            for key, _ in batch:
+                self.next_allowed[key] = now + self.interval
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            for key, value in batch:
+                try:
+                    self.send(key, value)
+                    self.sent += 1
+                except Exception as e:
+                    print(f"❌ Coalescer send error for {key}: {e}")
+            if not self.running and not batch:
+                return
+
+    def stop(self):
+        """ Flushes whatever is still pending and stops the background thread. """
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join()
@@ -0,0 +1,110 @@
+""" Compact binary log of the input events the control scripts act on.
+
+Enable it with thetis_daemon.py --record FILE, or by setting THETIS_RECORD_EVENTS=FILE
+before starting thetis-midi-map.py or vfo-aimos.py, and play the file back with
+replay_events.py.
+
+File layout: a header (magic, version, wall-clock start time) followed by fixed 12-byte
+records: nanoseconds since the start of the recording, the event source and three data
+bytes (the raw MIDI message, or the virtual key code). Only mapped media keys are
+recorded, never ordinary typing.
+"""
+import os
+import struct
+import threading
+import time
+
+MAGIC = b"THEV"
+VERSION = 1
+HEADER = struct.Struct("<4sBd")  # magic, version, time.time() at start
+RECORD = struct.Struct("<QB3s")  # ns since start, source, data bytes
+
+MIDI_EVENT = 0
+KEY_EVENT = 1
+
+FLUSH_INTERVAL = 1.0  # Seconds between flushes of the record buffer to disk
+RECORD_ENV = "THETIS_RECORD_EVENTS"
+
+
+class EventRecorder:
+    """ Appends timestamped input events to a file from whichever thread sees them.
+
+    record() packs 12 bytes into a buffered file; a background thread flushes it, so the
+    MIDI callback and the key hook never wait on the disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb", buffering=64 * 1024)
+        self.file.write(HEADER.pack(MAGIC, VERSION, time.time()))
+        self.started = time.perf_counter_ns()
+        self.lock = threading.Lock()
+        self.count = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._flush_loop, name="event-recorder", daemon=True)
+        self.thread.start()
+
+    def record(self, source, data):
+        record = RECORD.pack(time.perf_counter_ns() - self.started, source, bytes(data[:3]))
+        with self.lock:
+            if self.running:
+                self.file.write(record)
+                self.count += 1
+
+    def record_midi(self, message):
+        self.record(MIDI_EVENT, message)
+
+    def record_key(self, key_code):
+        self.record(KEY_EVENT, (key_code,))
+
+    def _flush_loop(self):
+        while self.running:
+            time.sleep(FLUSH_INTERVAL)
+            with self.lock:
+                if self.running:
+                    self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.running = False
+            self.file.close()
+
+
+def read_events(path):
+    """ Yields (seconds since start, source, data bytes) from a recording. """
+    with open(path, "rb") as f:
+        magic, version, _ = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} event recording")
+        while chunk := f.read(RECORD.size * 1024):
+            # A recording cut short by a crash may end with a partial record
+            usable = len(chunk) - len(chunk) % RECORD.size
+            for ns, source, data in RECORD.iter_unpack(chunk[:usable]):
+                yield ns / 1e9, source, data
+
+
+# The active recorder; the scripts check it once per event
+recorder = None
+
+
+def start_recording(path):
+    global recorder
+    if recorder is None:
+        recorder = EventRecorder(path)
+        print(f"⏺️ Recording input events to {path}")
+    return recorder
+
+
+def start_recording_from_env():
+    """ Starts recording to $THETIS_RECORD_EVENTS, if set. """
+    path = os.environ.get(RECORD_ENV)
+    if path:
+        return start_recording(path)
+
+
+def stop_recording():
+    global recorder
+    if recorder is not None:
+        recorder.close()
+        print(f"⏹️ Recorded {recorder.count} input events to {recorder.path}")
+        recorder = None
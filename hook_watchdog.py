@@ -0,0 +1,62 @@
+import logging
+
+from cat_metrics import metrics
+
+# Windows removes a low-level hook that does not return within LowLevelHooksTimeout
+# (300 ms by default on recent versions) and stops calling it without telling us.
+HOOK_WARN_SECONDS = 0.02  # A hook call this slow is logged and counted
+HOOK_DEGRADE_SECONDS = 0.1  # Consecutive calls this slow switch the hook to degraded mode
+DEGRADE_STRIKES = 3
+RECOVER_EVENTS = 50  # Fast calls in a row needed to leave degraded mode
+
+logger = logging.getLogger("hook_watchdog")
+
+
+class HookWatchdog:
+    """ Times every call of an OS input hook and degrades it before the OS drops it.
+
+    The hook calls record() with its own duration. Slow calls are counted in
+    hook_slow_total and logged; DEGRADE_STRIKES consecutive calls over degrade_after set
+    `degraded`, and RECOVER_EVENTS fast calls clear it again. Listeners are called with
+    the new state so the hook owner can shed optional work while degraded.
+    """
+
+    def __init__(self, name, warn_after=HOOK_WARN_SECONDS, degrade_after=HOOK_DEGRADE_SECONDS,
+                 strikes=DEGRADE_STRIKES, recover_after=RECOVER_EVENTS):
+        self.name = name
+        self.warn_after = warn_after
+        self.degrade_after = degrade_after
+        self.strikes = strikes
+        self.recover_after = recover_after
+        self.degraded = False
+        self.slow_streak = 0
+        self.fast_streak = 0
+        self.listeners = []
+        metrics.register_gauge("hook_degraded", lambda: int(self.degraded), name)
+
+    def record(self, seconds):
+        metrics.observe("hook_seconds", seconds, self.name)
+        if seconds >= self.warn_after:
+            metrics.inc("hook_slow_total", self.name)
+            logger.warning("operation=hook_watchdog, %s hook took %.1f ms", self.name, seconds * 1000)
+        if seconds >= self.degrade_after:
+            self.fast_streak = 0
+            self.slow_streak += 1
+            if not self.degraded and self.slow_streak >= self.strikes:
+                self._set_degraded(True)
+        else:
+            self.slow_streak = 0
+            if self.degraded:
+                self.fast_streak += 1
+                if self.fast_streak >= self.recover_after:
+                    self._set_degraded(False)
+
+    def _set_degraded(self, degraded):
+        self.degraded = degraded
+        self.fast_streak = 0
+        if degraded:
+            logger.warning("operation=hook_watchdog, %s hook is close to the OS timeout, degrading", self.name)
+        else:
+            logger.info("operation=hook_watchdog, %s hook is fast again, leaving degraded mode", self.name)
+        for callback in self.listeners:
+            callback(degraded)
@@ -0,0 +1,117 @@
+""" Logging for the control scripts, written from a background thread.
+
+Loggers only put records on a queue: formatting and I/O happen in a QueueListener
+thread, so a log call from the keyboard hook or the MIDI callback costs a level check
+and, when enabled, one queue put. Use lazy %-style arguments (logger.debug("x=%s", x))
+so disabled levels never build their message.
+
+Levels can be set per subsystem (logger name) in code or with THETIS_LOG_LEVELS, e.g.
+
+    set THETIS_LOG_LEVELS=vfo_aimos.hook=DEBUG,thetis_daemon=WARNING
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+from cat_metrics import metrics
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+LOG_LEVELS_ENV = "THETIS_LOG_LEVELS"
+
+# Default levels for the chatty subsystems; everything else follows the root level
+SUBSYSTEM_LEVELS = {
+    "vfo_aimos.hook": logging.INFO,
+}
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """ Queues the record untouched; the listener thread does all the formatting.
+
+    QueueHandler.prepare() formats the message on the calling thread so records can be
+    pickled to another process. The queue here never leaves the process, so that work
+    (and any str() of the arguments) is left to the listener.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """ Lets through at most `rate` records per second per call site, in bursts of `burst`.
+
+    Records are keyed by logger name and unformatted message, so one noisy line cannot
+    starve the others. Suppressed records are counted in log_suppressed_total.
+    """
+
+    def __init__(self, rate=5.0, burst=10):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}  # (logger, msg) -> (tokens, last refill time)
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        tokens, last = self.buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            metrics.inc("log_suppressed_total", record.name)
+            return False
+        self.buckets[key] = (tokens - 1, now)
+        return True
+
+
+def parse_levels(spec):
+    """ "a=DEBUG,b.c=WARNING" -> {"a": 10, "b.c": 30}; unknown levels are ignored. """
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        level = logging.getLevelName(level.strip().upper())
+        if isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+def setup_logging(level=logging.INFO, levels=None, log_file=None):
+    """ Routes all logging through one background listener; safe to call more than once.
+
+    levels maps logger names to levels and is applied on top of SUBSYSTEM_LEVELS and
+    under THETIS_LOG_LEVELS. Returns the QueueListener.
+    """
+    global _listener
+    with _listener_lock:
+        for name, subsystem_level in {**SUBSYSTEM_LEVELS, **(levels or {}),
+                                      **parse_levels(os.environ.get(LOG_LEVELS_ENV, ""))}.items():
+            logging.getLogger(name).setLevel(subsystem_level)
+        if _listener is not None:
+            return _listener
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = []
+        if sys.stderr is not None:  # None under pythonw
+            handlers.append(logging.StreamHandler())
+        if log_file:
+            handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(DeferredQueueHandler(log_queue))
+        root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+import tomllib
+
+import cat_command
+from script_loader import SCRIPT_DIR
+
+MAPPING_FILE = os.path.join(SCRIPT_DIR, "mappings.toml")
+RELOAD_POLL_INTERVAL = 1.0  # Seconds between checks of the mapping file's modification time
+
+KEY_TYPES = {"stepTune", "volume", "mute"}
+DIRECTIONS = {"up", "down"}
+PAD_EVENTS = {"note_on", "note_off"}
+
+
+class MappingError(ValueError):
+    """ The mapping file is malformed; the previous mappings stay in effect. """
+
+
+def _int_key(section, key, low, high):
+    try:
+        value = int(key)
+    except ValueError:
+        raise MappingError(f"[{section}] key {key!r} is not a number") from None
+    if not low <= value <= high:
+        raise MappingError(f"[{section}] key {key} is outside {low}-{high}")
+    return value
+
+
+def _unique(section, pairs):
+    """ Builds a dict, rejecting keys that collide once normalised (e.g. "7" and "07"). """
+    result = {}
+    for key, value in pairs:
+        if key in result:
+            raise MappingError(f"[{section}] defines {key} more than once")
+        result[key] = value
+    return result
+
+
+def _command(section, key, value):
+    if not isinstance(value, str) or not value.upper().startswith("ZZ") or len(value.rstrip(";")) < 4:
+        raise MappingError(f"[{section}] {key}: {value!r} is not a ZZ CAT command")
+    return value
+
+
+def _table(section, key, value, required):
+    if not isinstance(value, dict):
+        raise MappingError(f"[{section}] {key} must be a table")
+    missing = [field for field in required if field not in value]
+    if missing:
+        raise MappingError(f"[{section}] {key} is missing {', '.join(missing)}")
+    return value
+
+
+def parse_radios(section):
+    """ [radios] -> {name: (host, port)} for cat_command.set_radios. """
+    def entry(name, value):
+        value = _table("radios", name, value, ("host",))
+        port = value.get("port", cat_command.THETIS_PORT)
+        if not isinstance(value["host"], str) or not isinstance(port, int) or not 0 < port < 65536:
+            raise MappingError(f"[radios] {name}: needs a host name and a port number")
+        return value["host"], port
+    return {name: entry(name, value) for name, value in section.items()}
+
+
+def _radio(section, key, value, radios):
+    """ A "radio" field: one name or a list of names -> None (default radio) or a tuple. """
+    if value is None:
+        return None
+    names = (value,) if isinstance(value, str) else value
+    if not isinstance(names, list | tuple) or not names or not all(isinstance(n, str) for n in names):
+        raise MappingError(f"[{section}] {key}: radio must be a name or a list of names")
+    unknown = [name for name in names if name not in radios]
+    if unknown:
+        raise MappingError(f"[{section}] {key}: unknown radio {', '.join(unknown)}")
+    names = tuple(dict.fromkeys(names))
+    return None if names == (cat_command.DEFAULT_RADIO,) else names
+
+
+def _targeted_command(section, key, value, radios):
+    """ "ZZTX1;" or { command = "ZZTX1;", radio = ["main", "rx2"] } -> command or (command, radio). """
+    if isinstance(value, dict):
+        value = _table(section, key, value, ("command",))
+        radio = _radio(section, key, value.get("radio"), radios)
+        command = _command(section, key, value["command"])
+        return command if radio is None else (command, radio)
+    return _command(section, key, value)
+
+
+def parse_knobs(section, radios=()):
+    """ [midi.knobs] -> MIDI_TO_CAT shape: {control: {"command", "scale", optional "radio"}}. """
+    def entry(key, value):
+        value = _table("midi.knobs", key, value, ("command", "scale"))
+        _command("midi.knobs", key, value["command"])
+        if not isinstance(value["scale"], int) or value["scale"] <= 0:
+            raise MappingError(f"[midi.knobs] {key}: scale must be a positive integer")
+        return {**value, "radio": _radio("midi.knobs", key, value.get("radio"), radios)}
+    return _unique("midi.knobs", ((_int_key("midi.knobs", k, 0, 127), entry(k, v)) for k, v in section.items()))
+
+
+def parse_pads(section, radios=()):
+    """ [midi.pads] -> MIDI_TO_CAT_MOMENTARY note entries: {"<note>-<event>": command}. """
+    def key_for(key):
+        note, _, event = key.partition("-")
+        if event not in PAD_EVENTS:
+            raise MappingError(f"[midi.pads] {key!r} must look like '<note>-note_on' or '<note>-note_off'")
+        return f"{_int_key('midi.pads', note, 0, 127)}-{event}"
+    return _unique("midi.pads", ((key_for(k), _targeted_command("midi.pads", k, v, radios))
+                                  for k, v in section.items()))
+
+
+def parse_programs(section, radios=()):
+    """ [midi.programs] -> MIDI_TO_CAT_MOMENTARY program entries: {program: command}. """
+    return _unique("midi.programs", ((_int_key("midi.programs", k, 0, 127),
+                                      _targeted_command("midi.programs", k, v, radios))
+                                     for k, v in section.items()))
+
+
+def parse_keys(section, radios=()):
+    """ [keys] -> suppressed_keys shape: {vk_code: {"msg", "type", "direction", optional "radio"}}. """
+    def entry(key, value):
+        value = _table("keys", key, value, ("type",))
+        if value["type"] not in KEY_TYPES:
+            raise MappingError(f"[keys] {key}: type must be one of {', '.join(sorted(KEY_TYPES))}")
+        if value["type"] != "mute" and value.get("direction") not in DIRECTIONS:
+            raise MappingError(f"[keys] {key}: direction must be 'up' or 'down'")
+        value = {"msg": 256, **value, "radio": _radio("keys", key, value.get("radio"), radios)}
+        if value["radio"] is None:
+            del value["radio"]
+        return value
+    return _unique("keys", ((_int_key("keys", k, 1, 254), entry(k, v)) for k, v in section.items()))
+
+
+def parse_tune_steps(section):
+    """ [tune_steps] -> TUNE_STEPS shape: {code: {"step", "cmd", "active", "step_text"}}. """
+    def entry(key, value):
+        value = _table("tune_steps", key, value, ("step", "cmd", "active", "step_text"))
+        _command("tune_steps", key, value["cmd"])
+        if not isinstance(value["active"], bool):
+            raise MappingError(f"[tune_steps] {key}: active must be true or false")
+        return dict(value)
+    steps = _unique("tune_steps", ((_int_key("tune_steps", k, 0, 99), entry(k, v)) for k, v in section.items()))
+    if steps and not any(step["active"] for step in steps.values()):
+        raise MappingError("[tune_steps] at least one step must be active")
+    return steps
+
+
+def parse_button_menu(section):
+    """ [button_menu] -> BUTTON_MENU shape with menu function names left as strings. """
+    def entry(key, value):
+        return dict(_table("button_menu", key, value, ("menu_function", "vfo_control_cmd")))
+    return _unique("button_menu", ((_int_key("button_menu", k, 0, 99), entry(k, v)) for k, v in section.items()))
+
+
+def configure_radios(config):
+    """ Validates [radios] and returns (radios to install, every name entries may use). """
+    radios = parse_radios(config.get("radios", {}))
+    return radios, cat_command.radio_names(radios)
+
+
+def load_config(path=MAPPING_FILE):
+    """ Reads the mapping file; returns {} when it does not exist. """
+    try:
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    except FileNotFoundError:
+        return {}
+    except tomllib.TOMLDecodeError as e:
+        # Also raised for keys defined twice
+        raise MappingError(f"{os.path.basename(path)}: {e}") from None
+
+
+class MappingStore:
+    """ Holds the compiled dispatch tables for one script and hot-reloads them.
+
+    `compile` turns the parsed mapping file into whatever flat tables the script looks
+    up per event. Readers take `store.current` once per event; a reload builds new
+    tables off to the side and swaps the reference, so in-flight events finish on the
+    old tables and a broken file never replaces working mappings.
+    """
+
+    def __init__(self, compile, path=MAPPING_FILE):
+        self.compile = compile
+        self.path = path
+        self.mtime = self._mtime()
+        try:
+            self.current = compile(load_config(path))
+        except MappingError as e:
+            print(f"❌ {e}; using the built-in mappings")
+            self.current = compile({})
+        self.listeners = []
+        self.thread = None
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def swap(self, tables):
+        self.current = tables
+        for callback in self.listeners:
+            callback(tables)
+
+    def reload(self):
+        """ Recompiles the mapping file; returns False (keeping the old tables) on error. """
+        try:
+            tables = self.compile(load_config(self.path))
+        except (MappingError, OSError) as e:
+            print(f"❌ Mapping reload failed, keeping previous mappings: {e}")
+            return False
+        self.swap(tables)
+        print(f"🔁 Reloaded mappings from {os.path.basename(self.path)}")
+        return True
+
+    def start_watching(self, interval=RELOAD_POLL_INTERVAL):
+        """ Polls the file's modification time and reloads when it changes. """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._watch, args=(interval,), name="mapping-reload", daemon=True)
+            self.thread.start()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            mtime = self._mtime()
+            if mtime != self.mtime:
+                self.mtime = mtime
+                self.reload()
@@ -0,0 +1,89 @@
+import math
+from collections import namedtuple
+
+from cat_command import EncodedCommand
+
+MIDI_VALUES = 128  # MIDI data bytes are 0-127
+
+# Status byte high nibbles (the low nibble is the MIDI channel)
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+CONTROL_CHANGE = 0xB0
+PROGRAM_CHANGE = 0xC0
+MESSAGE_STATUS = {"note_off": NOTE_OFF, "note_on": NOTE_ON, "control_change": CONTROL_CHANGE,
+                  "program_change": PROGRAM_CHANGE}
+STATUS_NAMES = {status: name for name, status in MESSAGE_STATUS.items()}
+
+
+def raw_key(status, data):
+    """ One int per (message type, first data byte), so a raw message needs no decoding. """
+    return (status << 8) | data
+
+
+def convert_to_hundred_scale(value):
+    result = math.floor((value * 100) / 127)
+    return f"{result:03d}"
+
+def convert_to_mod_scale(value, scale):
+    # Scale range [0, 64] to [-scale, 0]
+    if 0 <= value <= 64:
+        scaled_value = scale - math.floor((value / 64) * scale)
+        return f"-{scaled_value:04d}"  # Make it negative
+
+    # Centre detent
+    elif value == 65:
+        return f"{0:05d}"
+
+    # Scale range [66, 126] to [0, scale], 127 clamps to scale
+    elif 66 <= value <= 127:
+        scaled_value = math.floor(((min(value, 126) - 66) / (126 - 66)) * scale)
+        return f"{scaled_value:05d}"
+
+def knob_command(mapping, value):
+    """ Builds the CAT command for a MIDI_TO_CAT entry at MIDI value 0-127. """
+    match mapping["scale"]:
+        case 100:
+            scaled = convert_to_hundred_scale(value)
+        case _:
+            scaled = convert_to_mod_scale(value, mapping["scale"])
+    if scaled is None:
+        return None
+    return f"{mapping['command']}{scaled};"
+
+
+def compile_knob_tables(midi_to_cat):
+    """ Compiles MIDI_TO_CAT into {control: 128-entry tuple of ready-to-send payloads}. """
+    return {
+        control: tuple(
+            EncodedCommand(command, mapping.get("radio")) if command else None
+            for command in (knob_command(mapping, value) for value in range(MIDI_VALUES))
+        )
+        for control, mapping in midi_to_cat.items()
+    }
+
+
+def momentary_key(key):
+    """ "25-note_on" -> raw key of a note-on for note 25; an int is a program change number. """
+    if isinstance(key, str) and "-" in key:
+        note, message_type = key.split("-", 1)
+        return raw_key(MESSAGE_STATUS[message_type], int(note))
+    return raw_key(PROGRAM_CHANGE, key)
+
+
+def compile_momentary_table(midi_to_cat_momentary):
+    """ Compiles MIDI_TO_CAT_MOMENTARY into {raw_key(status, note or program): payload}.
+
+    Values are a command, or (command, radio) to send it to other radios by name.
+    """
+    return {
+        momentary_key(key): EncodedCommand(*command) if isinstance(command, tuple) else EncodedCommand(command)
+        for key, command in midi_to_cat_momentary.items()
+    }
+
+
+MidiTables = namedtuple("MidiTables", "knobs momentary")
+
+
+def compile_midi_tables(midi_to_cat, midi_to_cat_momentary):
+    """ Compiles both MIDI mappings; the result is swapped in whole on reload. """
+    return MidiTables(compile_knob_tables(midi_to_cat), compile_momentary_table(midi_to_cat_momentary))
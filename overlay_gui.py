@@ -0,0 +1,225 @@
+""" Qt side of the overlay; only imported inside the overlay process (see text_overlay). """
+from PyQt6.QtGui import QGuiApplication
+from PyQt6.QtWidgets import QApplication, QLabel, QVBoxLayout, QWidget
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QObject, QSocketNotifier
+import sys
+import threading
+import time
+
+from text_overlay import FRAME_END, send_frame
+
+OVERLAY_STYLE = "background-color: rgba(0, 0, 0, 180); color: white; font-size: 20px; padding: 20px; border-radius: 10px;"
+
+class OverlayMenu(QWidget):
+    def __init__(self, options, on_select_callback):
+            super().__init__()
+            self.options = options
+            self.current_index = 0
+            self.on_select_callback = on_select_callback
+            self.initUI()
+
+    def initUI(self):
+        self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.WindowStaysOnTopHint)
+        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+        self.setFixedSize(200, 150)
+
+        self.layout = QVBoxLayout()
+        self.label = QLabel("\n".join(self.get_menu_display()), self)
+        self.label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.layout.addWidget(self.label)
+        self.setLayout(self.layout)
+
+    def get_menu_display(self):
+        return [f"> {opt} <" if i == self.current_index else opt for i, opt in enumerate(self.options)]
+
+    def update_display(self):
+        self.label.setText("\n".join(self.get_menu_display()))
+
+    def navigate(self, direction):
+        self.current_index = (self.current_index + direction) % len(self.options)
+        self.update_display()
+
+    def select_option(self):
+        selected_option = self.options[self.current_index]
+        self.on_select_callback(selected_option)  # Trigger callback with selected option
+        self.hide()  # Hide the menu after selection
+
+class OverlayManager(QObject):
+    update_text_signal = pyqtSignal(str)
+    show_menu_signal = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        # The native window is configured exactly once; setWindowFlags recreates it
+        self.overlay = QLabel("")
+        self.overlay.setStyleSheet(OVERLAY_STYLE)
+        # Always on top and not shown in the taskbar
+        self.overlay.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.WindowStaysOnTopHint | Qt.WindowType.Tool)
+        self.overlay.setWindowOpacity(0.8)  # 80% opacity
+        self.overlay.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.overlay.resize(300, 100)
+        self.overlay.move(800, 500)
+        self.geometry = None
+
+        # Create a QTimer for hiding the overlay after the last message
+        self.hide_timer = QTimer()
+        self.hide_timer.setSingleShot(True)
+        self.hide_timer.timeout.connect(self.overlay.hide)
+
+        # Menu overlay is initially None
+        self.menu_overlay = None 
+        self.show_menu_signal.connect(self.show_menu)
+
+        self.update_text_signal.connect(self.update_text)
+
+    def update_text(self, message):
+        """Updates the overlay text and auto-hides after 4 seconds."""
+        # Only move the window when Thetis itself moved
+        geometry = window_cache.get()
+        if geometry != self.geometry:
+            self.geometry = geometry
+            position_overlay(self.overlay)
+        if message != self.overlay.text():
+            self.overlay.setText(message)
+        if not self.overlay.isVisible():
+            self.overlay.show()
+
+        # Reset the timer to hide after the specified time
+        self.hide_timer.start(4000)
+
+    def show_menu(self):
+        if self.menu_overlay is None:
+            menu_options = ["VFO B Control", "Volume Control", "Option 3"]
+            self.menu_overlay = OverlayMenu(menu_options, self.handle_menu_selection)
+            self.menu_overlay.show()
+
+    def handle_menu_selection(self, selected_option):
+        print(f"Selected option: {selected_option}")
+        # Add logic for each option (e.g., VFO B control, volume control)
+
+WINDOW_REFRESH_INTERVAL = 1.0  # Seconds between background re-reads of the Thetis window position
+WINDOW_RESCAN_INTERVAL = 5.0  # Seconds between full window scans while Thetis is not found
+
+def position_overlay(overlay):
+    """Position the overlay on the same screen where Thetis SDR is displayed."""
+    thetis_pos = window_cache.get()
+    if thetis_pos:
+        thetis_x, thetis_y, screen_width, screen_height = thetis_pos
+
+        
+
+        # Position the overlay to the same screen as Thetis window
+        overlay.resize(300, 100)
+        overlay.move(thetis_x + (screen_width - 300) // 2, thetis_y + screen_height - 200)  # 20px margin from the bottom
+
+def find_thetis_window():
+    """Find Thetis window by enumerating the top-level windows (expensive)."""
+    import pygetwindow as gw  # Windows-only; imported on first scan
+    # Iterate through all open windows to find Thetis window by title
+    for window in gw.getWindowsWithTitle('Thetis'):
+            if window.title.startswith("Thetis") and "x64" in window.title and window.visible:
+                return window
+    return None
+
+def window_geometry(window):
+    """Reads the current geometry of an already found window (cheap, no enumeration)."""
+    return window.left, window.top, window.size.width, window.size.height
+
+class WindowGeometryCache:
+    """Thetis window geometry kept in memory and refreshed in the background.
+
+    The window handle found by the last scan is re-read cheaply every refresh; a full
+    window enumeration only happens when the handle stops being valid, and at most every
+    WINDOW_RESCAN_INTERVAL while Thetis is not running.
+    """
+
+    def __init__(self, refresh_interval=WINDOW_REFRESH_INTERVAL, rescan_interval=WINDOW_RESCAN_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.rescan_interval = rescan_interval
+        self.window = None
+        self.geometry = None
+        self.last_scan = None
+        self.reported_missing = False
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def get(self):
+        """Returns the cached (x, y, width, height) or None; only scans if never loaded."""
+        if self.last_scan is None:
+            self.refresh()
+        return self.geometry
+
+    def refresh(self):
+        with self.lock:
+            geometry = None
+            if self.window is not None:
+                try:
+                    if self.window.visible:
+                        geometry = window_geometry(self.window)
+                except Exception:
+                    pass  # Window was closed; its handle is no longer valid
+            if geometry is None:
+                now = time.monotonic()
+                if self.last_scan is None or now - self.last_scan >= self.rescan_interval:
+                    self.last_scan = now
+                    self.window = find_thetis_window()
+                    geometry = window_geometry(self.window) if self.window else None
+            if geometry is None and not self.reported_missing:
+                print("Thetis window not found!")  # Once per disappearance, not per message
+            self.reported_missing = geometry is None
+            self.geometry = geometry
+
+    def start(self):
+        """Starts the background refresher thread."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="thetis-window", daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Thetis window refresh error: {e}")
+            time.sleep(self.refresh_interval)
+
+window_cache = WindowGeometryCache()
+
+def run_overlay(conn, started_at, import_seconds):
+    """Runs the PyQt application; called in the overlay process by text_overlay.overlay_process."""
+    app = QApplication(sys.argv)
+    window_cache.start()
+    overlay_manager = OverlayManager()
+    conn.setblocking(False)
+    buffer = bytearray()
+    first_shown = False
+
+    def read_messages():
+        nonlocal first_shown
+        try:
+            while True:
+                data = conn.recv(65536)
+                if not data:
+                    app.quit()  # Parent went away
+                    return
+                buffer.extend(data)
+        except BlockingIOError:
+            pass
+
+        *frames, rest = buffer.split(FRAME_END)
+        buffer[:] = rest
+        messages = [frame.decode("utf-8", errors="replace") for frame in frames]
+        if "show_menu" in messages:
+            overlay_manager.show_menu_signal.emit()  # Show the menu overlay
+        texts = [message for message in messages if message != "show_menu"]
+        if texts:
+            # A burst of messages only renders the newest one
+            overlay_manager.update_text_signal.emit(texts[-1])
+            if not first_shown:
+                first_shown = True
+                send_frame(conn, f"shown {time.monotonic()}")
+
+    notifier = QSocketNotifier(conn.fileno(), QSocketNotifier.Type.Read)
+    notifier.activated.connect(read_messages)
+    send_frame(conn, f"ready {time.monotonic()} {import_seconds}")
+    sys.exit(app.exec())
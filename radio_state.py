@@ -0,0 +1,192 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+import cat_command
+from cat_async import CATClientThread, query_cat_many
+from cat_parser import CATFrame, parse_frame
+
+# CAT prefixes mirrored locally (value = what Thetis reports after the prefix)
+TRACKED_COMMANDS = {
+    "ZZFA": "VFO A frequency",
+    "ZZFB": "VFO B frequency",
+    "ZZAC": "Tune step",
+    "ZZBS": "RX1 band",
+    "ZZTX": "MOX",
+    "ZZTU": "TUN",
+    "ZZFL": "RX1 filter low",
+    "ZZFH": "RX1 filter high",
+    "ZZIT": "Variable filter shift",
+    "ZZLA": "RX1 volume",
+    "ZZLC": "RX2 volume",
+    "ZZSW": "TX VFO",
+}
+
+# Relative commands that change a tracked value without carrying it
+RELATIVE_COMMANDS = {
+    "ZZSA": "ZZFA",  # VFO A down one tune step
+    "ZZSB": "ZZFA",  # VFO A up one tune step
+    "ZZIU": "ZZIT",  # Reset filter shift
+}
+
+QUEUED_LIMIT = 64  # Queued-but-unsent values remembered per prefix
+REFRESH_INTERVAL = 5.0  # Seconds a cached value is trusted before it is re-read from Thetis
+
+
+class RadioState:
+    """ Local mirror of the Thetis settings the control scripts care about.
+
+    Values are learned from the commands we send, from query replies and from
+    auto-information (ZZAI) pushes, so handlers can read them from memory instead of
+    doing a CAT round trip per key press. A value older than refresh_interval is
+    re-read from Thetis on the next get().
+    """
+
+    def __init__(self, query=None, refresh_interval=REFRESH_INTERVAL):
+        self.query = query or cat_command.query_cat
+        self.refresh_interval = refresh_interval
+        self.values = {}
+        self.queued = {}  # prefix -> values noted by note_queued and not yet seen by note_sent
+        self.lock = threading.Lock()
+        self.auto_info_client = None
+        self.push_client = None  # AsyncCATClient ZZAI pushes were last enabled on
+        self.refresh_thread = None
+        self.attached = False
+
+    def apply(self, frames):
+        """ Updates the mirror from one or more ';'-separated CAT frames. """
+        now = time.monotonic()
+        for frame in frames.split(";"):
+            prefix, value = parse_frame(frame.strip())
+            with self.lock:
+                if prefix in TRACKED_COMMANDS and value:
+                    self.values[prefix] = (value, now)
+                elif prefix in RELATIVE_COMMANDS:
+                    self.values.pop(RELATIVE_COMMANDS[prefix], None)
+
+    def note_queued(self, command):
+        """ Mirrors a command as soon as it is queued, ahead of its send. """
+        self.apply(command)
+        for frame in command.split(";"):
+            prefix, value = parse_frame(frame.strip())
+            if prefix in TRACKED_COMMANDS and value:
+                with self.lock:
+                    self.queued.setdefault(prefix, deque(maxlen=QUEUED_LIMIT)).append(value)
+
+    def note_sent(self, command):
+        """ Mirrors a command once it was written to Thetis.
+
+        A command noted by note_queued was mirrored already; applying it again when its
+        send completes would roll back any newer value queued behind it.
+        """
+        for frame in command.split(";"):
+            prefix, value = parse_frame(frame.strip())
+            with self.lock:
+                queued = self.queued.get(prefix)
+                if queued and value in queued:
+                    # Entries ahead of this one were dropped by the dispatcher, never sent
+                    while queued.popleft() != value:
+                        pass
+                    continue
+            self.apply(frame)
+
+    def invalidate(self, prefix=None):
+        with self.lock:
+            if prefix is None:
+                self.values.clear()
+            else:
+                self.values.pop(prefix, None)
+
+    @property
+    def following_pushes(self):
+        """ True while ZZAI auto-information is enabled on a live connection. """
+        return self.push_client is not None and self.push_client.connected
+
+    def peek(self, prefix):
+        """ Returns the cached value for prefix without ever querying Thetis. """
+        with self.lock:
+            entry = self.values.get(prefix)
+        return entry[0] if entry else None
+
+    def get(self, prefix, max_age=None):
+        """ Returns the value for prefix, refreshing it from Thetis when missing or stale. """
+        max_age = self.refresh_interval if max_age is None else max_age
+        with self.lock:
+            entry = self.values.get(prefix)
+        if entry and time.monotonic() - entry[1] <= max_age:
+            return entry[0]
+        reply = self.query(prefix)
+        if reply:
+            self.apply(reply)
+        return self.peek(prefix)
+
+    def get_int(self, prefix, max_age=None):
+        """ get() as a number ("+0100" -> 100), or None when missing or not numeric. """
+        value = self.get(prefix, max_age)
+        return CATFrame(prefix, value).number if value else None
+
+    def attach(self):
+        """ Follows every command sent and every reply read through cat_command. """
+        if not self.attached:
+            self.attached = True
+            cat_command.add_send_listener(self.note_sent)
+            cat_command.add_reply_listener(self.apply)
+
+    def start(self, auto_info=True):
+        """ Enables Thetis auto-information and starts the background refresher. """
+        if auto_info and self.auto_info_client is None:
+            self.auto_info_client = CATClientThread(on_unsolicited=self.apply)
+        if self.refresh_thread is None:
+            self.refresh_thread = threading.Thread(target=self._refresh_loop, name="radio-state", daemon=True)
+            self.refresh_thread.start()
+
+    def refresh(self):
+        """ Re-reads every tracked value in one pipelined batch, over the auto-information
+        connection when there is one rather than opening a second. """
+        prefixes = list(TRACKED_COMMANDS)
+        query_many = self.auto_info_client.query_many if self.auto_info_client is not None else query_cat_many
+        for reply in query_many(prefixes):
+            if reply:
+                self.apply(reply)
+
+    async def run(self, client):
+        """ Event-loop version of start(): auto-information and refresh over an AsyncCATClient. """
+        client.on_unsolicited = self.apply
+        prefixes = list(TRACKED_COMMANDS)
+        while True:
+            try:
+                await client.send("ZZAI1;")
+                self.push_client = client
+                for reply in await client.query_many(prefixes):
+                    if reply:
+                        self.apply(reply)
+            except (ConnectionError, OSError, asyncio.TimeoutError) as e:
+                print(f"❌ CAT auto-information error: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def _refresh_loop(self):
+        while True:
+            if self.auto_info_client is not None:
+                try:
+                    # Re-enabled every cycle so a Thetis restart does not silence the pushes
+                    self.auto_info_client.send("ZZAI1;")
+                    self.push_client = self.auto_info_client.client
+                except Exception as e:
+                    print(f"❌ CAT auto-information error: {e}")
+            self.refresh()
+            time.sleep(self.refresh_interval)
+
+
+# One mirror per process, shared by every script and component running in it
+_radio_state = None
+_radio_state_lock = threading.Lock()
+
+
+def get_radio_state():
+    global _radio_state
+    with _radio_state_lock:
+        if _radio_state is None:
+            _radio_state = RadioState()
+            _radio_state.attach()
+        return _radio_state
@@ -0,0 +1,185 @@
+""" Replays a recorded input session against a local Thetis simulator.
+
+Feeds every recorded MIDI message and media-key press back through the scripts' own
+mapping and dispatch code (on_midi_input and the key worker queue), with the original
+timing, N times faster, or as fast as possible, then reports the CAT command stream the
+simulator received and the latency from each event to the CAT command it caused:
+
+    python replay_events.py contest.thev
+    python replay_events.py contest.thev --speed 4 --latency-ms 5 --stream
+    python replay_events.py contest.thev --speed 0 --output replay.json
+"""
+import argparse
+import collections
+import json
+import statistics
+import time
+
+import cat_command
+from event_recorder import KEY_EVENT, MIDI_EVENT, read_events
+from midi_mapping import CONTROL_CHANGE, NOTE_OFF, NOTE_ON, raw_key
+from script_loader import load_script
+from thetis_sim import ThetisSimulator
+
+SETTLE_TIMEOUT = 2.0  # Seconds to wait for the last commands after the final event
+
+# CAT prefixes each media-key type can produce (mute only toggles the menu)
+KEY_PREFIXES = {
+    "stepTune": {"ZZAC"},
+    "volume": {"ZZFA", "ZZSA", "ZZSB"},
+}
+
+
+def percentile(samples, p):
+    if len(samples) < 2:
+        return samples[0] if samples else None
+    return statistics.quantiles(samples, n=100, method="inclusive")[p - 1]
+
+
+def midi_prefixes(midi_map, data):
+    """ CAT prefixes a raw MIDI message maps to under the script's current tables. """
+    tables = midi_map.midi_mappings.current
+    status = data[0] & 0xF0
+    if status == CONTROL_CHANGE:
+        return {payload.prefix for payload in tables.knobs.get(data[1], ()) if payload}
+    if status == NOTE_ON and data[2] == 0:
+        status = NOTE_OFF
+    payload = tables.momentary.get(raw_key(status, data[1]))
+    return {payload.prefix} if payload else set()
+
+
+def load_injectors(events):
+    """ Loads only the scripts the recording needs.
+
+    Returns {source: (inject(data), prefixes(data))}, where prefixes gives the CAT
+    prefixes an event can produce, so its latency is measured to one of those.
+    """
+    injectors = {}
+    if any(source == MIDI_EVENT for _, source, _ in events):
+        midi_map = load_script("thetis-midi-map.py")
+        injectors[MIDI_EVENT] = (lambda data: midi_map.on_midi_input((list(data), 0.0)),
+                                 lambda data: midi_prefixes(midi_map, data))
+    if any(source == KEY_EVENT for _, source, _ in events):
+        vfo = load_script("vfo-aimos.py")
+        # The overlay is a separate GUI process; keep it out of the replay
+        vfo.show_overlay = lambda message: None
+        vfo.start_key_worker()
+        injectors[KEY_EVENT] = (
+            lambda data: vfo.key_events.put((data[0], time.perf_counter())),
+            lambda data: KEY_PREFIXES.get(vfo.key_mappings.current.keys.get(data[0], {}).get("type"), set()),
+        )
+    return injectors
+
+
+def replay(events, sim, speed):
+    """ Injects events on their original schedule divided by speed (0 = no waiting). """
+    injectors = load_injectors(events)
+    # Loading the scripts installs the [radios] from mappings.toml; keep them off the air
+    cat_command.route_radios(sim.address)
+    injected = []  # (monotonic time, commands the simulator had already received, expected prefixes)
+    start = time.monotonic()
+    for offset, source, data in events:
+        if speed:
+            delay = start + offset / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        inject, prefixes = injectors[source]
+        injected.append((time.monotonic(), len(sim.received), prefixes(data)))
+        inject(data)
+
+    # Wait until the stream has been quiet for a moment
+    deadline = time.monotonic() + SETTLE_TIMEOUT
+    seen = -1
+    while time.monotonic() < deadline and seen != len(sim.received):
+        seen = len(sim.received)
+        time.sleep(0.2)
+    return injected
+
+
+def event_latencies(injected, received, is_query):
+    """ Milliseconds from each event to the first unclaimed CAT command it can produce.
+
+    Reads the scripts issue on their own (mirror refreshes, telemetry) never count, and
+    each command is credited to one event only. Events folded into an earlier event's
+    write, suppressed as duplicates or dropped are returned as a count of unmatched
+    events instead of borrowing another event's timing; events that send nothing by
+    design (e.g. mute) are left out.
+    """
+    latencies = []
+    unmatched = 0
+    claimed = set()
+    for injected_at, before, prefixes in injected:
+        if not prefixes:
+            continue
+        for index in range(before, len(received)):
+            arrived_at, _, command = received[index]
+            if (index not in claimed and arrived_at >= injected_at and not is_query(command)
+                    and cat_command.cat_prefix(command) in prefixes):
+                claimed.add(index)
+                latencies.append((arrived_at - injected_at) * 1000)
+                break
+        else:
+            unmatched += 1
+    return latencies, unmatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded MIDI/key input against a Thetis simulator")
+    parser.add_argument("recording", help="File written by thetis_daemon.py --record")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor; 0 replays as fast as possible")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated Thetis processing delay")
+    parser.add_argument("--stream", action="store_true", help="Print every CAT command received")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    events = list(read_events(args.recording))
+    if not events:
+        print("Recording contains no events")
+        return
+
+    sim = ThetisSimulator(latency=args.latency_ms / 1000)
+    cat_command.THETIS_IP, cat_command.THETIS_PORT = sim.start()
+    started = time.monotonic()
+    injected = replay(events, sim, args.speed)
+    received = list(sim.received)
+    sim.stop()
+
+    # The simulator answers exactly the commands naming a value it holds (ZZFA, ZZSM0, ...)
+    latencies, unmatched = event_latencies(injected, received, lambda command: command.upper() in sim.state)
+    sources = collections.Counter("midi" if source == MIDI_EVENT else "key" for _, source, _ in events)
+    prefixes = collections.Counter(cat_command.cat_prefix(command) for *_, command in received)
+    report = {
+        "recording": args.recording,
+        "speed": args.speed,
+        "simulated_latency_ms": args.latency_ms,
+        "events": dict(sources),
+        "recorded_seconds": events[-1][0],
+        "cat_commands": len(received),
+        "commands_by_prefix": dict(prefixes.most_common()),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies) if latencies else None,
+        "matched_events": len(latencies),
+        "unmatched_events": unmatched,
+        "stream": [[round(arrived_at - started, 6), command] for arrived_at, _, command in received],
+    }
+
+    if args.stream:
+        for offset, command in report["stream"]:
+            print(f"{offset:10.4f}s  {command}")
+    print(f"{sum(sources.values())} events ({', '.join(f'{n} {s}' for s, n in sources.items())}) over "
+          f"{report['recorded_seconds']:.1f}s -> {len(received)} CAT commands")
+    print("  " + "  ".join(f"{prefix} {count}" for prefix, count in prefixes.most_common()))
+    if latencies:
+        print(f"event -> CAT latency  p50 {report['p50_ms']:.2f} ms  p95 {report['p95_ms']:.2f} ms  "
+              f"p99 {report['p99_ms']:.2f} ms  max {report['max_ms']:.2f} ms  ({len(latencies)} events)")
+    if unmatched:
+        print(f"{unmatched} events produced no command of their own (coalesced, deduplicated or dropped)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
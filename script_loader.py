@@ -0,0 +1,25 @@
+import importlib.util
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_script(filename, module_name=None):
+    """ Imports one of the hyphenated scripts (e.g. vfo-aimos.py) as a module.
+
+    The script's `if __name__ == "__main__"` block does not run, and the module is
+    cached in sys.modules so loading it twice returns the same instance.
+    """
+    module_name = module_name or os.path.splitext(filename)[0].replace("-", "_")
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPT_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from cat_metrics import metrics
+
+ACCEL_WINDOW = 0.04  # Seconds of detents folded into one frequency write
+IDLE_RESET = 0.5  # A pause this long resets the measured spin rate
+
+# (detents per second, step multiplier): the highest threshold not above the rate wins
+ACCELERATION_CURVE = ((0, 1), (15, 2), (30, 5), (60, 10))
+
+
+def multiplier_for(rate, curve=ACCELERATION_CURVE):
+    multiplier = 1
+    for threshold, factor in curve:
+        if rate >= threshold:
+            multiplier = factor
+    return multiplier
+
+
+class StepAccumulator:
+    """ Folds bursts of encoder detents into absolute frequency writes.
+
+    add() records a detent (+1 up, -1 down) and returns immediately. A background thread
+    sends the first detent after an idle period at once, then at most one absolute
+    frequency per `window`, computed from the current frequency, the tune step, the net
+    detent count and an acceleration multiplier taken from the measured spin rate. Until
+    the spin pauses for IDLE_RESET, the current frequency is the previous write's target.
+    When get_frequency cannot vouch for a current frequency (returns None, e.g. the
+    re-read failed) it falls back to one relative step per detent.
+    """
+
+    def __init__(self, get_frequency, get_step, send_frequency, send_relative,
+                 window=ACCEL_WINDOW, curve=ACCELERATION_CURVE):
+        self.get_frequency = get_frequency
+        self.get_step = get_step
+        self.send_frequency = send_frequency
+        self.send_relative = send_relative
+        self.window = window
+        self.curve = curve
+        self.pending = 0
+        self.detents = 0
+        self.last_detent = 0.0
+        self.interval = None  # Smoothed seconds between detents
+        self.next_flush = 0.0
+        self.last_target = None  # Frequency of the last absolute write, and when it was sent
+        self.last_sent_at = 0.0
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="step-accumulator", daemon=True)
+        self.thread.start()
+
+    @property
+    def rate(self):
+        """ Current spin rate in detents per second. """
+        return 1.0 / self.interval if self.interval else 0.0
+
+    def add(self, direction):
+        now = time.monotonic()
+        with self.cond:
+            gap = now - self.last_detent
+            if gap > IDLE_RESET:
+                self.interval = None
+            else:
+                self.interval = gap if self.interval is None else 0.7 * self.interval + 0.3 * gap
+            self.last_detent = now
+            self.pending += direction
+            self.detents += 1
+            self.cond.notify()
+
+    def _take(self):
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                if self.detents and now >= self.next_flush:
+                    break
+                self.cond.wait(self.next_flush - now if self.detents else None)
+            net, detents = self.pending, self.detents
+            multiplier = multiplier_for(self.rate, self.curve)
+            self.pending = self.detents = 0
+            self.next_flush = now + self.window
+            return net, detents, multiplier
+
+    def _run(self):
+        while True:
+            net, detents, multiplier = self._take()
+            metrics.inc("coalesced_total", "vfo_steps", detents - 1)
+            if not net:
+                continue
+            try:
+                now = time.monotonic()
+                if self.last_target is not None and now - self.last_sent_at <= IDLE_RESET:
+                    # Mid-spin, build on our own last write: the mirror may still be catching
+                    # up (a late push or poll of an earlier write) and would lose detents
+                    frequency = self.last_target
+                else:
+                    frequency = self.get_frequency()
+                step = self.get_step()
+                if frequency is None or not step:
+                    self.last_target = None
+                    for _ in range(abs(net)):
+                        self.send_relative(1 if net > 0 else -1)
+                    continue
+                self.last_target = max(0, frequency + net * multiplier * step)
+                self.last_sent_at = now
+                self.send_frequency(self.last_target)
+            except Exception as e:
+                print(f"❌ Step accumulator error: {e}")
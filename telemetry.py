@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from cat_async import query_cat_many
+from cat_metrics import metrics
+from radio_state import get_radio_state
+
+# Readings polled every cycle: name -> read command (the reply is the command plus its value)
+TELEMETRY_COMMANDS = {
+    "s_meter": "ZZSM0",        # RX1 S-meter, 000-260 = -140 to -10 dBm
+    "forward_power": "ZZRM5",  # Forward power (W)
+    "swr": "ZZRM8",            # SWR
+    "alc": "ZZRM4",            # ALC (dB)
+    "frequency": "ZZFA",       # VFO A frequency (Hz)
+}
+TX_ONLY = {"forward_power", "swr", "alc"}  # Meaningless on receive, so only polled during MOX/TUN
+
+RX_INTERVAL = 0.5  # Seconds between polls on receive
+TX_INTERVAL = 0.1  # Seconds between polls during MOX/TUN
+
+
+def parse_reading(command, reply):
+    """ Turns the reply to a telemetry read into a number (dBm for the S-meter). """
+    text = reply[len(command):].strip()
+    try:
+        value = float(text.split()[0])
+    except (IndexError, ValueError):
+        return None
+    if command.upper().startswith("ZZSM"):
+        return value / 2 - 140
+    return value
+
+
+def s_units(dbm):
+    """ -73 dBm is S9; each S unit below it is 6 dB. """
+    if dbm >= -73:
+        return f"S9+{round(dbm + 73)}" if dbm > -72.5 else "S9"
+    return f"S{max(0, 9 + round((dbm + 73) / 6))}"
+
+
+class TelemetrySnapshot(namedtuple("TelemetrySnapshot", "taken_at transmitting values")):
+    """ One poll's readings; never modified, so any thread can keep and read it. """
+
+    __slots__ = ()
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+    @property
+    def age(self):
+        return time.monotonic() - self.taken_at if self.taken_at else None
+
+    def overlay_line(self):
+        """ Compact text for the overlay, e.g. "S9+10" or "50W  SWR 1.2  ALC 0". """
+        parts = []
+        if self.transmitting:
+            if self.get("forward_power") is not None:
+                parts.append(f"{self.get('forward_power'):.0f}W")
+            if self.get("swr") is not None:
+                parts.append(f"SWR {self.get('swr'):.1f}")
+            if self.get("alc") is not None:
+                parts.append(f"ALC {self.get('alc'):.0f}")
+        elif self.get("s_meter") is not None:
+            parts.append(s_units(self.get("s_meter")))
+        return "  ".join(parts)
+
+
+EMPTY_SNAPSHOT = TelemetrySnapshot(None, False, MappingProxyType({}))
+
+
+class TelemetryPoller:
+    """ Reads the meters and frequency in one pipelined batch per cycle.
+
+    Each cycle sends every read command in a single write, parses the replies in one
+    pass and replaces `snapshot` with a new TelemetrySnapshot; readers (the overlay,
+    metrics gauges) never cause CAT traffic of their own. Polling speeds up to
+    tx_interval while radio_state shows MOX or TUN, when the TX meters are added.
+    """
+
+    def __init__(self, commands=None, radio_state=None, rx_interval=RX_INTERVAL, tx_interval=TX_INTERVAL):
+        self.commands = dict(commands or TELEMETRY_COMMANDS)
+        self.radio_state = radio_state or get_radio_state()
+        self.rx_interval = rx_interval
+        self.tx_interval = tx_interval
+        self.snapshot = EMPTY_SNAPSHOT
+        self.thread = None
+        for name in self.commands:
+            metrics.register_gauge("telemetry", lambda name=name: self.snapshot.get(name), name)
+
+    @property
+    def transmitting(self):
+        return self.radio_state.peek("ZZTX") == "1" or self.radio_state.peek("ZZTU") == "1"
+
+    def _names(self, transmitting):
+        return [name for name in self.commands if transmitting or name not in TX_ONLY]
+
+    def _publish(self, names, replies, transmitting):
+        values = {}
+        for name, reply in zip(names, replies):
+            if reply is None:
+                continue
+            # Frequency and other mirrored values come along for free
+            self.radio_state.apply(reply)
+            value = parse_reading(self.commands[name], reply)
+            if value is not None:
+                values[name] = value
+        self.snapshot = TelemetrySnapshot(time.monotonic(), transmitting, MappingProxyType(values))
+        metrics.inc("telemetry_polls_total", "tx" if transmitting else "rx")
+
+    def poll(self):
+        """ One synchronous cycle over the shared pipelined client. """
+        transmitting = self.transmitting
+        names = self._names(transmitting)
+        self._publish(names, query_cat_many([self.commands[name] for name in names]), transmitting)
+        return self.snapshot
+
+    def start(self):
+        """ Polls from a background thread. """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._poll_loop, name="telemetry", daemon=True)
+            self.thread.start()
+
+    def _poll_loop(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"❌ Telemetry poll error: {e}")
+            interval = self.tx_interval if self.snapshot.transmitting else self.rx_interval
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    async def run(self, client):
+        """ Event-loop version of start(), polling over an AsyncCATClient. """
+        while True:
+            started = time.monotonic()
+            transmitting = self.transmitting
+            names = self._names(transmitting)
+            try:
+                replies = await client.query_many([self.commands[name] for name in names])
+                self._publish(names, replies, transmitting)
+            except (ConnectionError, OSError, asyncio.TimeoutError) as e:
+                print(f"❌ Telemetry poll error: {e}")
+            interval = self.tx_interval if transmitting else self.rx_interval
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
@@ -1,166 +1,162 @@
-import pygetwindow as gw
-from PyQt6.QtGui import QGuiApplication
-from PyQt6.QtWidgets import QApplication, QLabel, QVBoxLayout, QWidget
-from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QObject
-import sys
 import multiprocessing
-import queue
-
-class OverlayMenu(QWidget):
-    def __init__(self, options, on_select_callback):
-            super().__init__()
-            self.options = options
-            self.current_index = 0
-            self.on_select_callback = on_select_callback
-            self.initUI()
-
-    def initUI(self):
-        self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.WindowStaysOnTopHint)
-        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
-        self.setFixedSize(200, 150)
-
-        self.layout = QVBoxLayout()
-        self.label = QLabel("\n".join(self.get_menu_display()), self)
-        self.label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.layout.addWidget(self.label)
-        self.setLayout(self.layout)
-
-    def get_menu_display(self):
-        return [f"> {opt} <" if i == self.current_index else opt for i, opt in enumerate(self.options)]
-
-    def update_display(self):
-        self.label.setText("\n".join(self.get_menu_display()))
-
-    def navigate(self, direction):
-        self.current_index = (self.current_index + direction) % len(self.options)
-        self.update_display()
-
-    def select_option(self):
-        selected_option = self.options[self.current_index]
-        self.on_select_callback(selected_option)  # Trigger callback with selected option
-        self.hide()  # Hide the menu after selection
-
-class OverlayManager(QObject):
-    update_text_signal = pyqtSignal(str)
-    show_menu_signal = pyqtSignal()
-
-    def __init__(self):
-        super().__init__()
-        self.overlay = QLabel("")
-        self.overlay.setStyleSheet("background-color: rgba(0, 0, 0, 180); color: white; font-size: 20px; padding: 20px; border-radius: 10px;")
-        self.overlay.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.WindowStaysOnTopHint)
-        self.overlay.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.overlay.resize(300, 100)
-        self.overlay.move(800, 500)
-
-        # Create a QTimer for hiding the overlay after the last message
-        self.hide_timer = QTimer()
-        self.hide_timer.setSingleShot(True)
-        self.hide_timer.timeout.connect(self.overlay.hide)
-
-        # Make the window not show in the taskbar
-        self.overlay.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.WindowStaysOnTopHint | Qt.WindowType.Tool)
-
-        # Menu overlay is initially None
-        self.menu_overlay = None 
-        self.show_menu_signal.connect(self.show_menu)
-
-        self.update_text_signal.connect(self.update_text)
-
-    def update_text(self, message):
-        """Updates the overlay text and auto-hides after 1 second."""
-        # Set the overlay's style (transparency and text styling)
-        self.overlay.setStyleSheet("background-color: rgba(0, 0, 0, 180); color: white; font-size: 20px; padding: 20px; border-radius: 10px;")
-        
-        # Set the overlay to always be on top and not show in the taskbar
-        self.overlay.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.WindowStaysOnTopHint | Qt.WindowType.Tool)
-        
-        
-        # Set the transparency level (80% opacity)
-        self.overlay.setWindowOpacity(0.8)  # 80% opacity
-        position_overlay(self.overlay)
-        self.overlay.setText(message)
-        self.overlay.show()
-
-        # Reset the timer to hide after the specified time (e.g., 6 seconds)
-        self.hide_timer.start(4000)
-
-    def show_menu(self):
-        if self.menu_overlay is None:
-            menu_options = ["VFO B Control", "Volume Control", "Option 3"]
-            self.menu_overlay = OverlayMenu(menu_options, self.handle_menu_selection)
-            self.menu_overlay.show()
-
-    def handle_menu_selection(self, selected_option):
-        print(f"Selected option: {selected_option}")
-        # Add logic for each option (e.g., VFO B control, volume control)
-
-def position_overlay(overlay):
-    """Position the overlay on the same screen where Thetis SDR is displayed."""
-    thetis_pos = get_thetis_window_position()
-    if thetis_pos:
-        thetis_x, thetis_y, screen_width, screen_height = thetis_pos
-
-        
-
-        # Position the overlay to the same screen as Thetis window
-        overlay.resize(300, 100)
-        overlay.move(thetis_x + (screen_width - 300) // 2, thetis_y + screen_height - 200)  # 20px margin from the bottom
-
-def get_thetis_window_position():
-    """Find Thetis window and get its position."""
-    thetis_window = None
-    # Iterate through all open windows to find Thetis window by title
-    for window in gw.getWindowsWithTitle('Thetis'):
-            if window.title.startswith("Thetis") and "x64" in window.title and window.visible:
-                thetis_window = window
-                break
-
-    if thetis_window:
-        return thetis_window.left, thetis_window.top, thetis_window.size.width, thetis_window.size.height
-    else:
-        print("Thetis window not found!")
-        return None
-
-def overlay_process(message_queue):
-    """Runs the PyQt application in a separate process."""
-    app = QApplication(sys.argv)
-    overlay_manager = OverlayManager()
+import select
+import socket
+import threading
+import time
 
-    def check_queue():
-        try:
-            while True:
-                message = message_queue.get_nowait()  # Get message from queue
-                if message == "show_menu":
-                    overlay_manager.show_menu_signal.emit()  # Show the menu overlay
-                else:
-                    overlay_manager.update_text_signal.emit(message)
-        except queue.Empty:
-            pass
-        QTimer.singleShot(100, check_queue)  # Check queue every 100ms
-
-    check_queue()  # Start checking messages
-    sys.exit(app.exec())
+from cat_metrics import metrics
+
+# The GUI (PyQt6, pygetwindow) lives in overlay_gui and is only imported in the overlay
+# process, so importing this module costs the parent process next to nothing.
+
+# Overlay messages are NUL-terminated UTF-8 frames on a socketpair
+FRAME_END = b"\0"
+MAX_PENDING_BYTES = 64 * 1024  # Older unsent messages are dropped rather than blocking the caller beyond this
+
+def send_frame(conn, message):
+    """Writes one small frame, ignoring a full socket buffer."""
+    try:
+        conn.send(message.encode("utf-8") + FRAME_END)
+    except (BlockingIOError, OSError):
+        pass
+
+def overlay_process(conn, started_at):
+    """Runs the PyQt application in a separate process."""
+    import_start = time.monotonic()
+    import overlay_gui
+    overlay_gui.run_overlay(conn, started_at, time.monotonic() - import_start)
 
 # Global variables for communication
-overlay_queue = multiprocessing.Queue()
+overlay_conn = None
 overlay_proc = None
+overlay_lock = threading.Lock()
+pending = bytearray()
+flusher = None  # Thread finishing a partial flush once the overlay process reads again
+
+# Startup timings reported by the overlay process, in seconds
+startup_timing = {}
+overlay_started_at = None
+first_message_at = None
+
+enabled = True  # False (e.g. thetis_daemon --no-overlay) turns show_overlay into a no-op
+
+# Optional telemetry.TelemetryPoller; its latest snapshot is added under each message
+telemetry = None
+TELEMETRY_MAX_AGE = 2.0  # Seconds after which a snapshot is too old to show
 
 def start_overlay():
     """Starts the overlay process if not already running."""
-    global overlay_proc
-    if overlay_proc is None or not overlay_proc.is_alive():
-        overlay_proc = multiprocessing.Process(target=overlay_process, args=(overlay_queue,))
-        overlay_proc.start()
+    global overlay_proc, overlay_conn, overlay_started_at
+    with overlay_lock:
+        if overlay_proc is None or not overlay_proc.is_alive():
+            if overlay_conn is not None:
+                overlay_conn.close()
+            overlay_conn, child_conn = socket.socketpair()
+            overlay_conn.setblocking(False)
+            pending.clear()
+            overlay_started_at = time.monotonic()
+            startup_timing.clear()
+            overlay_proc = multiprocessing.Process(target=overlay_process, args=(child_conn, overlay_started_at))
+            overlay_proc.start()
+            child_conn.close()
+            threading.Thread(target=_read_status, args=(overlay_conn,), name="overlay-status", daemon=True).start()
+
+def prewarm_overlay():
+    """Starts the overlay process in the background so the first message finds Qt ready."""
+    threading.Thread(target=start_overlay, name="overlay-prewarm", daemon=True).start()
+
+def _read_status(conn):
+    """Collects the startup timings the overlay process reports back."""
+    buffer = bytearray()
+    while True:
+        try:
+            select.select([conn], [], [])
+            data = conn.recv(4096)
+        except BlockingIOError:
+            continue
+        except (OSError, ValueError):
+            return  # Connection closed (overlay restarted or exiting)
+        if not data:
+            return
+        buffer.extend(data)
+        *frames, rest = buffer.split(FRAME_END)
+        buffer[:] = rest
+        for frame in frames:
+            _record_status(frame.decode("utf-8", errors="replace").split())
+
+def _record_status(fields):
+    match fields:
+        case ["ready", ready_at, import_seconds]:
+            startup_timing["gui_import"] = float(import_seconds)
+            startup_timing["ready"] = float(ready_at) - overlay_started_at
+            metrics.observe("overlay_startup_seconds", startup_timing["gui_import"], "gui_import")
+            metrics.observe("overlay_startup_seconds", startup_timing["ready"], "ready")
+            print(f"Overlay ready in {startup_timing['ready'] * 1000:.0f} ms "
+                  f"(GUI import {startup_timing['gui_import'] * 1000:.0f} ms)")
+        case ["shown", shown_at] if first_message_at is not None:
+            startup_timing["first_overlay"] = float(shown_at) - first_message_at
+            metrics.observe("overlay_startup_seconds", startup_timing["first_overlay"], "first_overlay")
+            print(f"First overlay shown {startup_timing['first_overlay'] * 1000:.0f} ms after it was requested")
+
+def _flush_pending():
+    """Writes as much of the pending buffer as the socket takes without blocking."""
+    try:
+        while pending:
+            sent = overlay_conn.send(pending)
+            del pending[:sent]
+    except BlockingIOError:
+        pass
+
+def _flush_when_writable(conn):
+    """Keeps flushing as the socket drains, so the last message never waits for the next one."""
+    global flusher
+    while True:
+        try:
+            select.select([], [conn], [])
+        except (OSError, ValueError):
+            pass  # Closed; the flush below fails too and ends the thread
+        with overlay_lock:
+            try:
+                if conn is overlay_conn:
+                    _flush_pending()
+            except OSError:
+                pending.clear()
+            if conn is not overlay_conn or not pending:
+                flusher = None
+                return
 
 def show_overlay(message):
-    """Sends a message to the overlay process."""
-    if overlay_proc and overlay_proc.is_alive():
-        overlay_queue.put(message)
-    else:
+    """Sends a message to the overlay process without blocking the caller."""
+    global first_message_at, flusher
+    if not enabled:
+        return
+    if telemetry is not None and message != "show_menu":
+        snapshot = telemetry.snapshot
+        line = snapshot.overlay_line() if snapshot.age is not None and snapshot.age < TELEMETRY_MAX_AGE else ""
+        if line:
+            message = f"{message}\n{line}"
+    if first_message_at is None:
+        first_message_at = time.monotonic()
+    if overlay_proc is None or not overlay_proc.is_alive():
         print("Overlay process is not running. Starting now...")
         start_overlay()
-        overlay_queue.put(message)
+    with overlay_lock:
+        frame = message.encode("utf-8") + FRAME_END
+        if len(pending) + len(frame) > MAX_PENDING_BYTES:
+            # Only the newest text matters: drop the unsent backlog, but finish the frame
+            # at the front, which may already be partly written
+            del pending[pending.find(FRAME_END) + 1:]
+            metrics.inc("overlay_backlog_dropped_total")
+        pending.extend(frame)
+        try:
+            _flush_pending()
+        except OSError as e:
+            print(f"Overlay connection error: {e}")
+            return
+        if pending and flusher is None:
+            flusher = threading.Thread(target=_flush_when_writable, args=(overlay_conn,),
+                                       name="overlay-flush", daemon=True)
+            flusher.start()
 
 # Main logic to simulate knob button press
 def on_knob_button_press():
@@ -1,8 +1,8 @@
 @echo off
 cd /d "%~dp0"
 
-REM Run the scripts in the background
-start "" pythonw.exe thetis-midi-map.py
-start "" pythonw.exe vfo-aimos.py
+REM Run the MIDI listener, media-key hook and overlay in one background process
+REM (they share one CAT link; the scripts can still be started on their own)
+start "" pythonw.exe thetis_daemon.py
 
 exit
\ No newline at end of file
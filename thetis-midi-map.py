@@ -2,7 +2,15 @@ import time
 import math
 import sys
 import subprocess
-from cat_command import send_cat_command  # Import the function
+import cat_command
+import event_recorder
+from cat_dispatcher import dispatch_cat_command, shutdown_dispatchers
+from coalescer import Coalescer
+from cat_metrics import metrics
+from midi_mapping import (CONTROL_CHANGE, NOTE_OFF, NOTE_ON, STATUS_NAMES, compile_midi_tables,
+                          raw_key)
+from mapping_config import MappingStore, configure_radios, parse_knobs, parse_pads, parse_programs
+from radio_state import get_radio_state
 
 try:
     import mido
@@ -22,12 +30,17 @@ except ModuleNotFoundError:
 # print(mido.get_input_names())
 # MIDI Device Name (Run `mido.get_input_names()` to check available names)
 MIDI_DEVICE_NAME = "LPD8 1"  # Adjust to match your MIDI device
+MIDI_INPUT_MODE = "callback"  # "callback": python-rtmidi delivers raw bytes; "mido": iterate mido messages
+PORT_CHECK_INTERVAL = 1.0  # Seconds between checks that the MIDI device is still connected
+KNOB_MAX_RATE_HZ = 50  # Max CAT updates per second per knob; intermediate values are dropped
+METRICS_PORT = 9109  # Local HTTP port serving /metrics and /metrics.json (None to disable)
 # Global Tkinter Window
 root = None
 label = None
 gTime = time.time()
 
 # Mapping of MIDI Notes/CC to CAT Commands
+# Built-in defaults; the [midi] section of mappings.toml overrides them and is reloaded on change
 # MIDI_TO_CAT = {
 #     1: "ZZAD04;",  # C1 - Set frequency Up 100Hz
 #     2: "ZZAu04;",  # C#1 - Set frequency Down 100Hz
@@ -101,62 +114,120 @@ def calculate_sleep_time(value):
 last_cmd = []
 velocity = 0.05
 
-def convert_to_hundred_scale(value):
-    result = math.floor((value * 100) / 127)
-    return f"{result:03d}"
-
-def convert_to_mod_scale(value, scale):
-    # Scale range [0, 64] to [-scale, 0]
-    if 0 <= value <= 64:
-        scaled_value = scale - math.floor((value / 64) * scale)
-        return f"-{scaled_value:04d}"  # Make it negative
-
-    # Scale range [66, 126] to [0, scale]
-    elif 66 <= value <= 126:
-        scaled_value = math.floor(((value - 66) / (126 - 66)) * scale)
-        return f"{scaled_value:05d}"
-
+def compile_midi_mappings(config):
+    """ Compiles the [midi] section of the mapping file, falling back to the dicts above.
+
+    Entries may name the radio(s) they control (see [radios] and cat_command.RADIOS).
+    """
+    radios, names = configure_radios(config)
+    midi = config.get("midi", {})
+    knobs = parse_knobs(midi["knobs"], names) if "knobs" in midi else MIDI_TO_CAT
+    if "pads" in midi or "programs" in midi:
+        momentary = {**parse_pads(midi.get("pads", {}), names), **parse_programs(midi.get("programs", {}), names)}
+    else:
+        momentary = MIDI_TO_CAT_MOMENTARY
+    tables = compile_midi_tables(knobs, momentary)
+    cat_command.set_radios(radios)
+    return tables
+
+# Every possible knob value and pad press, encoded once per (re)load
+midi_mappings = MappingStore(compile_midi_mappings)
+
+def knob_to_cat(key, value):
+    """ Returns the CAT command for knob `key` at MIDI value 0-127. """
+    payload = midi_mappings.current.knobs[key][value]
+    return payload.command if payload is not None else None
+
+def send_knob_value(key, value):
+    # The knob may have been removed by a reload since the value was queued
+    values = midi_mappings.current.knobs.get(key)
+    if values is not None and values[value] is not None:
+        dispatch_cat_command(values[value])
+
+# Knob sweeps only put the newest position on the wire
+knob_coalescer = Coalescer(send_knob_value, max_rate_hz=KNOB_MAX_RATE_HZ, name="midi_knobs")
+
+
+def handle_midi_bytes(message):
+    """ Maps one raw MIDI message ([status, data1, data2]) to its CAT command.
+
+    Returns False when the message is not mapped or the dispatcher refused it.
+    """
+    status = message[0] & 0xF0  # Any channel
+    tables = midi_mappings.current
+    if status == CONTROL_CHANGE:
+        # Knob Buttons
+        if message[1] not in tables.knobs:
+            return False
+        knob_coalescer.submit(message[1], message[2])
+        return True
+    if status == NOTE_ON and message[2] == 0:
+        status = NOTE_OFF  # A note-on with velocity 0 is a note-off
+    # Pad buttons and program changes
+    payload = tables.momentary.get(raw_key(status, message[1])) if len(message) > 1 else None
+    if payload is None:
+        return False
+    return dispatch_cat_command(payload)
+
+def on_midi_input(event, data=None):
+    """ python-rtmidi callback; event is ([status, data1, data2], delta seconds). """
+    start = time.perf_counter()
+    message = event[0]
+    if event_recorder.recorder is not None:
+        event_recorder.recorder.record_midi(message)
+    try:
+        handled = handle_midi_bytes(message)
+    except Exception as e:
+        handled = False
+        print(f"❌ MIDI message {message} failed: {e}")
+    metrics.inc("midi_messages_total", "processed" if handled else "dropped")
+    metrics.observe("midi_event_seconds", time.perf_counter() - start, STATUS_NAMES.get(message[0] & 0xF0, "other"))
+
+def listen_with_callback():
+    """ Receives MIDI on python-rtmidi's input thread until the device disappears. """
+    midi_in = rtmidi.MidiIn()
+    try:
+        port = midi_in.get_ports().index(MIDI_DEVICE_NAME)
+    except ValueError:
+        raise OSError(f"MIDI input {MIDI_DEVICE_NAME!r} not found") from None
+    midi_in.ignore_types(sysex=True, timing=True, active_sense=True)
+    midi_in.set_callback(on_midi_input)
+    midi_in.open_port(port)
+    try:
+        while MIDI_DEVICE_NAME in midi_in.get_ports():
+            time.sleep(PORT_CHECK_INTERVAL)
+        print(f"🔌 MIDI input {MIDI_DEVICE_NAME} disconnected")
+    finally:
+        midi_in.close_port()
+        midi_in.delete()
 
 def midi_listener():
     """ Listens for MIDI input and processes commands. """
     print(f"🎛️ Listening for MIDI input from {MIDI_DEVICE_NAME}...")
+    midi_mappings.start_watching()
     
     try:
-        with mido.open_input(MIDI_DEVICE_NAME) as midi_in:
-            for msg in midi_in:
-                if hasattr(msg, "note"):
-                    print(msg)
-                    # Pad buttons
-                    key = f"{msg.note}-{msg.type}"
-                    if key in MIDI_TO_CAT_MOMENTARY:
-                            cat_cmd = MIDI_TO_CAT_MOMENTARY[key]
-                            send_cat_command(cat_cmd)
-                    
-                elif (msg.type == "program_change"):
-                    key = msg.program
-                    cat_cmd = MIDI_TO_CAT_MOMENTARY[key]
-                    send_cat_command(cat_cmd)
-                    print(msg)
-                else:
-                    # Knob Buttons
-                    # print(vars(msg))
-                    key = msg.control
-                    if key in MIDI_TO_CAT and msg.value % 4 == 0:
-                        scale = MIDI_TO_CAT[key]["scale"]
-                        match scale:
-                            case 100:
-                                value =  convert_to_hundred_scale(msg.value)
-                            case _:
-                                value =  convert_to_mod_scale(msg.value, scale)
-
-                        cat_cmd = f"{MIDI_TO_CAT[key]["command"]}{value};"
-                        send_cat_command(cat_cmd)
-
-
-                        # time.sleep(0.1)  # Small delay to prevent excessive CPU usage
+        if MIDI_INPUT_MODE == "callback":
+            listen_with_callback()
+        else:
+            with mido.open_input(MIDI_DEVICE_NAME) as midi_in:
+                for msg in midi_in:
+                    on_midi_input((msg.bytes(), 0.0))
 
     except KeyboardInterrupt:
         print("\n🛑 Script exited by user.")
 
 if __name__ == "__main__":
-    midi_listener()
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_PORT)
+    metrics.start_summary_logger(log=print)
+    event_recorder.start_recording_from_env()
+    # Follow ZZAI pushes so a band or frequency changed in Thetis itself is not mistaken
+    # for the value we last sent (SentValues would suppress sending it again)
+    get_radio_state().start()
+    try:
+        midi_listener()
+    finally:
+        knob_coalescer.stop()
+        shutdown_dispatchers()
+        event_recorder.stop_recording()
@@ -0,0 +1,249 @@
+""" Single-process controller hosting the MIDI listener, keyboard hook and overlay.
+
+Replaces running thetis-midi-map.py and vfo-aimos.py as two processes. An asyncio loop
+starts, supervises and restarts the components and runs the radio-state (ZZAI) and
+telemetry polling. The inputs keep their own threads: the MIDI listener blocks in
+a daemon thread (rtmidi calls back on its input thread), and pynput runs the keyboard
+hook on its hook thread, with key presses handled by vfo-aimos.py's key worker. All of
+them share the process-wide CAT connection and per-radio dispatchers (cat_command /
+cat_dispatcher) and one radio-state mirror, so commands from both inputs are ordered on
+a single link; ZZAI pushes, mirror refreshes and meter polls share one pipelined
+AsyncCATClient, so the daemon holds two sockets to Thetis:
+
+    pythonw thetis_daemon.py
+    python thetis_daemon.py --no-midi --metrics-port 9109
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import threading
+
+import cat_command
+import event_recorder
+from cat_async import AsyncCATClient
+from cat_dispatcher import shutdown_dispatchers
+from cat_metrics import metrics
+from log_setup import setup_logging
+from radio_state import get_radio_state
+from telemetry import TelemetryPoller
+from script_loader import load_script
+
+RESTART_DELAY = 5.0  # Seconds before restarting a component whose input stopped
+
+logger = logging.getLogger("thetis_daemon")
+
+
+def run_in_daemon_thread(function, name):
+    """ Runs a blocking function in a daemon thread and returns an awaitable for its result. """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def run():
+        try:
+            result = function()
+        except BaseException as e:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_exception(e))
+        else:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(result))
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+
+class Component:
+    """ An input or output hosted by the daemon. """
+
+    name = "component"
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class MidiComponent(Component):
+    """ thetis-midi-map.py's listener; restarted when the MIDI device goes away. """
+
+    name = "midi"
+
+    def __init__(self):
+        self.midi_map = load_script("thetis-midi-map.py")
+        self.task = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_daemon_thread(self.midi_map.midi_listener, "midi-listener")
+                logger.warning("operation=midi_component, MIDI listener stopped, restarting")
+            except Exception as e:
+                logger.error("operation=midi_component, MIDI listener failed: %s", e)
+            await asyncio.sleep(RESTART_DELAY)
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+        self.midi_map.knob_coalescer.stop()
+
+
+class KeyboardComponent(Component):
+    """ vfo-aimos.py's media-key hook; restarted if the hook thread dies. """
+
+    name = "keyboard"
+
+    def __init__(self):
+        self.vfo = load_script("vfo-aimos.py")
+        self.task = None
+
+    async def start(self):
+        self.vfo.start_listener()
+        self.task = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(1)
+            if self.vfo.listener and not self.vfo.listener.is_alive():
+                logger.error("operation=keyboard_component, listener has stopped! Restarting...")
+                self.vfo.start_listener()
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+        if self.vfo.listener:
+            self.vfo.listener.stop()
+
+
+class OverlayComponent(Component):
+    """ The on-screen overlay process, started ahead of the first message. """
+
+    name = "overlay"
+
+    async def start(self):
+        import text_overlay
+        text_overlay.prewarm_overlay()
+
+
+class RadioStateComponent(Component):
+    """ Keeps the shared radio-state mirror fresh via ZZAI pushes on the daemon's loop. """
+
+    name = "radio_state"
+
+    def __init__(self, client):
+        self.client = client
+        self.task = None
+
+    async def start(self):
+        self.task = asyncio.create_task(get_radio_state().run(self.client))
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+
+
+class TelemetryComponent(Component):
+    """ Polls meters and frequency in pipelined batches and feeds the overlay's readout. """
+
+    name = "telemetry"
+
+    def __init__(self, client, show_in_overlay=True):
+        self.client = client
+        self.poller = TelemetryPoller()
+        self.show_in_overlay = show_in_overlay
+        self.task = None
+
+    async def start(self):
+        if self.show_in_overlay:
+            import text_overlay
+            text_overlay.telemetry = self.poller
+        self.task = asyncio.create_task(self.poller.run(self.client))
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+
+
+class ControllerDaemon:
+    def __init__(self, components, client=None):
+        self.components = components
+        self.client = client  # The pipelined CAT client the components share, closed last
+        self.stopping = None
+
+    async def run(self):
+        self.stopping = asyncio.Event()
+        started = []
+        try:
+            for component in self.components:
+                await component.start()
+                started.append(component)
+                logger.info("operation=daemon, started component %s", component.name)
+            await self.stopping.wait()
+        finally:
+            for component in reversed(started):
+                try:
+                    await component.stop()
+                except Exception as e:
+                    logger.error("operation=daemon, error stopping %s: %s", component.name, e)
+            if self.client:
+                await self.client.close()
+            shutdown_dispatchers(timeout=2)
+            cat_command.close_connections()
+            event_recorder.stop_recording()
+
+    def stop(self):
+        if self.stopping:
+            self.stopping.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thetis controller daemon")
+    parser.add_argument("--no-midi", action="store_true", help="Do not start the MIDI listener")
+    parser.add_argument("--no-keyboard", action="store_true", help="Do not install the media-key hook")
+    parser.add_argument("--no-overlay", action="store_true", help="Do not start or show the overlay")
+    parser.add_argument("--no-auto-info", action="store_true", help="Do not follow Thetis ZZAI pushes")
+    parser.add_argument("--no-telemetry", action="store_true", help="Do not poll meters for the overlay")
+    parser.add_argument("--metrics-port", type=int, default=9109, help="0 disables the metrics endpoint")
+    parser.add_argument("--record", metavar="FILE", help="Record MIDI and media-key input for replay_events.py")
+    parser.add_argument("--dedup-window", type=float, default=cat_command.DEDUP_WINDOW,
+                        help="Seconds within which an identical set command is not resent; 0 disables")
+    args = parser.parse_args()
+    cat_command.DEDUP_WINDOW = args.dedup_window
+
+    setup_logging()
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    metrics.start_summary_logger()
+    if args.record:
+        event_recorder.start_recording(args.record)
+    else:
+        event_recorder.start_recording_from_env()
+
+    # One pipelined connection carries the ZZAI pushes, mirror refreshes and meter polls
+    client = AsyncCATClient()
+    components = []
+    if not args.no_auto_info:
+        components.append(RadioStateComponent(client))
+    if not args.no_telemetry:
+        components.append(TelemetryComponent(client, show_in_overlay=not args.no_overlay))
+    if args.no_overlay:
+        import text_overlay
+        text_overlay.enabled = False  # Keyboard and MIDI messages must not spawn it either
+    else:
+        components.append(OverlayComponent())
+    if not args.no_keyboard:
+        components.append(KeyboardComponent())
+    if not args.no_midi:
+        components.append(MidiComponent())
+
+    try:
+        asyncio.run(ControllerDaemon(components, client).run())
+    except KeyboardInterrupt:
+        logger.info("operation=daemon, shutting down due to KeyboardInterrupt")
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # The overlay runs in a child process
+    main()
@@ -0,0 +1,247 @@
+""" Local stand-in for the Thetis CAT TCP server.
+
+Speaks the subset of the ZZ CAT protocol used by these scripts, keeps plausible radio
+state, can add per-command latency/jitter, limit concurrent connections and records
+every command it receives. Useful for benchmarks and tests on machines without Thetis:
+
+    python thetis_sim.py --port 13013 --latency-ms 5 --jitter-ms 2
+"""
+import argparse
+import random
+import socketserver
+import threading
+import time
+
+# Thetis tune step table, indexed by the ZZAC code
+TUNE_STEP_HZ = [1, 2, 10, 25, 50, 100, 250, 500, 1000, 2000, 2500, 5000, 6250, 9000, 10000,
+                12500, 15000, 20000, 25000, 30000, 50000, 100000, 250000, 500000, 1000000, 10000000]
+
+# VFO A frequency Thetis jumps to on a ZZBS band change
+BAND_FREQUENCIES = {
+    "160": 1840000, "080": 3573000, "060": 5357000, "040": 7074000, "030": 10136000,
+    "020": 14074000, "017": 18100000, "015": 21074000, "012": 24915000, "010": 28074000,
+    "006": 50313000,
+}
+
+DEFAULT_STATE = {
+    "ZZFA": "00014074000",
+    "ZZFB": "00014074000",
+    "ZZAC": "08",
+    "ZZBS": "020",
+    "ZZSW": "0",
+    "ZZTX": "0",
+    "ZZTU": "0",
+    "ZZTO": "050",
+    "ZZLA": "050",
+    "ZZLB": "050",
+    "ZZLC": "050",
+    "ZZLD": "050",
+    "ZZFL": "00100",
+    "ZZFH": "02800",
+    "ZZIT": "00000",
+    "ZZAI": "0",
+    "ZZSM0": "0120",
+    "ZZRM4": "0",
+    "ZZRM5": "0",
+    "ZZRM8": "1.0",
+}
+
+
+class ThetisSimulator(socketserver.ThreadingTCPServer):
+    """ Threaded TCP server emulating the Thetis CAT port. """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, command_latency=None,
+                 max_connections=None):
+        super().__init__((host, port), CATRequestHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.command_latency = command_latency or {}
+        self.max_connections = max_connections
+        self.state = dict(DEFAULT_STATE)
+        self.lock = threading.Lock()
+        self.received_cond = threading.Condition(self.lock)
+        self.received = []  # (monotonic time, connection id, command)
+        self.connections_opened = 0
+        self.connections_rejected = 0
+        self.clients = {}
+        self.thread = None
+
+    @property
+    def address(self):
+        return self.server_address[:2]
+
+    def start(self):
+        """ Serves in a background thread and returns (host, port). """
+        self.thread = threading.Thread(target=self.serve_forever, name="thetis-sim", daemon=True)
+        self.thread.start()
+        return self.address
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_log(self):
+        with self.lock:
+            self.received.clear()
+
+    def wait_for_commands(self, count, timeout=2.0):
+        """ Blocks until at least `count` commands have been received; returns False on timeout. """
+        with self.received_cond:
+            return self.received_cond.wait_for(lambda: len(self.received) >= count, timeout)
+
+    def commands(self):
+        """ Returns the received command strings, in arrival order. """
+        with self.lock:
+            return [command for _, _, command in self.received]
+
+    def delay_for(self, prefix):
+        base = self.command_latency.get(prefix, self.latency)
+        if self.jitter:
+            base += random.uniform(-self.jitter, self.jitter)
+        return max(0.0, base)
+
+    def execute(self, conn_id, command):
+        """ Applies one command to the state and returns the reply (or None). """
+        prefix = command[:4].upper()
+        params = command[4:]
+        with self.lock:
+            self.received.append((time.monotonic(), conn_id, command))
+            self.received_cond.notify_all()
+
+        delay = self.delay_for(prefix)
+        if delay:
+            time.sleep(delay)
+
+        with self.lock:
+            state = self.state
+            changed = []
+
+            # Meter reads carry their selector in the command (ZZSM0, ZZRM5, ...)
+            if command.upper() in state and prefix in ("ZZSM", "ZZRM"):
+                return f"{command.upper()}{state[command.upper()]};"
+
+            match prefix:
+                case "ZZSA" | "ZZSB":
+                    step = TUNE_STEP_HZ[int(state["ZZAC"])]
+                    freq = int(state["ZZFA"]) + (step if prefix == "ZZSB" else -step)
+                    state["ZZFA"] = f"{max(0, freq):011d}"
+                    changed.append("ZZFA")
+                case "ZZIU":
+                    state["ZZIT"] = "00000"
+                    changed.append("ZZIT")
+                case _ if prefix not in state:
+                    return "?;"
+                case _ if not params:
+                    return f"{prefix}{state[prefix]};"
+                case "ZZBS":
+                    state["ZZBS"] = params
+                    changed.append("ZZBS")
+                    if params in BAND_FREQUENCIES:
+                        state["ZZFA"] = f"{BAND_FREQUENCIES[params]:011d}"
+                        changed.append("ZZFA")
+                case "ZZAI":
+                    state["ZZAI"] = params
+                    self.clients[conn_id]["auto_info"] = params != "0"
+                case _:
+                    state[prefix] = params
+                    changed.append(prefix)
+
+            if changed:
+                push = "".join(f"{p}{state[p]};" for p in changed).encode()
+                for client_id, client in self.clients.items():
+                    if client_id != conn_id and client["auto_info"]:
+                        client["pending"].append(push)
+        return None
+
+
+class CATRequestHandler(socketserver.BaseRequestHandler):
+    def setup(self):
+        server = self.server
+        with server.lock:
+            if server.max_connections is not None and len(server.clients) >= server.max_connections:
+                server.connections_rejected += 1
+                self.conn_id = None
+                return
+            server.connections_opened += 1
+            self.conn_id = server.connections_opened
+            server.clients[self.conn_id] = {"auto_info": False, "pending": []}
+
+    def handle(self):
+        if self.conn_id is None:
+            return
+        server = self.server
+        sock = self.request
+        sock.settimeout(0.05)
+        buffer = b""
+        while True:
+            try:
+                data = sock.recv(4096)
+                if not data:
+                    return
+            except TimeoutError:
+                data = b""
+            except OSError:
+                return
+            buffer += data
+            *frames, buffer = buffer.split(b";")
+            replies = []
+            for frame in frames:
+                command = frame.decode("utf-8", errors="replace").strip()
+                if command:
+                    reply = server.execute(self.conn_id, command)
+                    if reply:
+                        replies.append(reply.encode())
+            with server.lock:
+                client = server.clients[self.conn_id]
+                replies.extend(client["pending"])
+                client["pending"].clear()
+            if replies:
+                try:
+                    sock.sendall(b"".join(replies))
+                except OSError:
+                    return
+
+    def finish(self):
+        if self.conn_id is not None:
+            with self.server.lock:
+                self.server.clients.pop(self.conn_id, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thetis CAT server simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=13013)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay applied to every command")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random +/- added to the delay")
+    parser.add_argument("--max-connections", type=int, default=None)
+    parser.add_argument("--log", help="Write every received command to this file on exit")
+    args = parser.parse_args()
+
+    server = ThetisSimulator(args.host, args.port, args.latency_ms / 1000, args.jitter_ms / 1000,
+                             max_connections=args.max_connections)
+    print(f"📡 Thetis CAT simulator listening on {args.host}:{server.address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Simulator stopped by user.")
+    finally:
+        server.server_close()
+        if args.log:
+            with open(args.log, "w") as f:
+                for timestamp, conn_id, command in server.received:
+                    f.write(f"{timestamp:.6f}\t{conn_id}\t{command}\n")
+        print(f"Received {len(server.received)} commands over {server.connections_opened} connections")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+TuneStep = namedtuple("TuneStep", "code step cmd overlay_text")
+
+
+class StepIndex:
+    """ Precomputed next/previous active tune step for every ZZAC code.
+
+    Built once from a TUNE_STEPS-style dict ({code: {"step", "cmd", "active", "step_text"}});
+    lookups are a single dict access. Instances never change, so they can be shared
+    between threads and replaced wholesale (see with_active) when the active set changes.
+    """
+
+    __slots__ = ("steps", "_next", "_previous")
+
+    def __init__(self, tune_steps):
+        codes = sorted(tune_steps)
+        steps = {
+            code: TuneStep(code, tune_steps[code]["step"], tune_steps[code]["cmd"],
+                           f"Step tune {tune_steps[code]['step_text']}")
+            for code in codes
+        }
+        active = [code for code in codes if tune_steps[code]["active"]]
+        next_steps, previous_steps = {}, {}
+        for code in codes:
+            later = [c for c in active if c > code]
+            earlier = [c for c in active if c < code]
+            if active:
+                next_steps[code] = steps[(later or active)[0]]
+                previous_steps[code] = steps[(earlier or active)[-1]]
+        self.steps = MappingProxyType({code: dict(tune_steps[code]) for code in codes})
+        self._next = MappingProxyType(next_steps)
+        self._previous = MappingProxyType(previous_steps)
+
+    def next(self, code):
+        """ Next larger active step after `code`, wrapping to the smallest. """
+        return self._next[code]
+
+    def previous(self, code):
+        """ Next smaller active step before `code`, wrapping to the largest. """
+        return self._previous[code]
+
+    def step_size(self, code):
+        return self.steps[code]["step"]
+
+    def with_active(self, active_codes):
+        """ Returns a new index where exactly `active_codes` are active. """
+        active_codes = set(active_codes)
+        return StepIndex({code: {**step, "active": code in active_codes} for code, step in self.steps.items()})
@@ -1,14 +1,35 @@
 from enum import Enum
 from pynput import keyboard
-from cat_command import send_cat_command, query_cat
-from text_overlay import show_overlay, on_knob_button_press
+import cat_command
+import event_recorder
+from cat_dispatcher import dispatch_cat_command, shutdown_dispatchers
+from cat_parser import parse_frame
+from radio_state import get_radio_state
+from tune_steps import StepIndex
+from mapping_config import (MappingError, MappingStore, configure_radios, parse_button_menu, parse_keys,
+                            parse_tune_steps)
+from step_accumulator import StepAccumulator
+from cat_metrics import metrics
+from log_setup import RateLimitFilter, setup_logging
+from hook_watchdog import HookWatchdog
+from text_overlay import show_overlay, on_knob_button_press, prewarm_overlay
 import logging
-import threading
 import time
-import re
+import queue
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+# Handlers run on log_setup's background thread; the hook logger is also rate limited
+logger = logging.getLogger("vfo_aimos")
+hook_logger = logging.getLogger("vfo_aimos.hook")
+hook_logger.addFilter(RateLimitFilter())
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+METRICS_PORT = 9110  # Local HTTP port serving /metrics and /metrics.json (None to disable)
+VFO_ACCEL_WINDOW = 0.04  # Seconds of VFO knob detents folded into one frequency write
+VFO_ACCELERATION_CURVE = ((0, 1), (15, 2), (30, 5), (60, 10))  # (detents/s, step multiplier)
+KEY_QUEUE_LIMIT = 64  # Key presses waiting for the worker; more are suppressed but dropped
+KEY_QUEUE_LIMIT_DEGRADED = 8  # Same, while the hook watchdog reports the hook as slow
 
 class MenuFunctions(Enum):
     CONTROL_VFO_A = ("VFO A \n Control")
@@ -88,7 +109,7 @@ BUTTON_MENU = {
     0: {"menu_function":MenuFunctions.CONTROL_VFO_A, "vfo_control_cmd": CATCommand.CONTROL_VFO_A},
     1: {"menu_function":MenuFunctions.CONTROL_VFO_B, "vfo_control_cmd": CATCommand.CONTROL_VFO_B},
     2: {"menu_function":MenuFunctions.VOLUME_VFO_A, "vfo_control_cmd":""},
-    2: {"menu_function":MenuFunctions.VOLUME_VFO_B, "vfo_control_cmd":""},
+    3: {"menu_function":MenuFunctions.VOLUME_VFO_B, "vfo_control_cmd":""},
 
 }
 
@@ -122,6 +143,9 @@ TUNE_STEPS = {
 }
 
 
+# Built-in defaults for BUTTON_MENU, TUNE_STEPS and suppressed_keys; the [button_menu],
+# [tune_steps] and [keys] sections of mappings.toml override them and are reloaded on change
+
 # Define the keys you want to suppress
 suppressed_keys = {
     177: {"msg": 256, "type": "stepTune", "direction": "up"},#keyboard.Key.media_next,
@@ -131,63 +155,127 @@ suppressed_keys = {
     173: {"msg": 256, "type": "mute"},#keyboard.Key.media_volume_mute
 }
 
+KeyTables = namedtuple("KeyTables", "keys tune_steps button_menu")
+
+def compile_key_mappings(config):
+    """ Compiles the key sections of the mapping file, falling back to the dicts above. """
+    radios, names = configure_radios(config)
+    keys = parse_keys(config["keys"], names) if "keys" in config else suppressed_keys
+    tune_steps = parse_tune_steps(config["tune_steps"]) if "tune_steps" in config else TUNE_STEPS
+    button_menu = BUTTON_MENU
+    if "button_menu" in config:
+        button_menu = {}
+        for code, entry in parse_button_menu(config["button_menu"]).items():
+            if entry["menu_function"] not in MenuFunctions.__members__:
+                raise MappingError(f"[button_menu] {code}: unknown menu_function {entry['menu_function']!r}")
+            button_menu[code] = {**entry, "menu_function": MenuFunctions[entry["menu_function"]]}
+    tables = KeyTables(MappingProxyType(dict(keys)), StepIndex(tune_steps), MappingProxyType(button_menu))
+    cat_command.set_radios(radios)
+    return tables
+
 # Global Variables
-tune_step_iterator = CircularIterator(TUNE_STEPS)
-menu_functions_iterator =  CircularIterator(BUTTON_MENU)
+key_mappings = MappingStore(compile_key_mappings)
+menu_functions_iterator =  CircularIterator(key_mappings.current.button_menu)
 keyboard_controller = keyboard.Controller()
 listener = None
 step_has_changed = False
 menu_toogle = MenuToogle.OFF
 
+# Local mirror of Thetis state, fed by our own commands, query replies and ZZAI pushes
+radio_state = get_radio_state()
+
 # data object coming from win32_event_filter(msg, data)
 data_object = None
 
-def send_command_in_thread(command: CATCommand, param:str = None):
-    def run():
+# Key presses handed from the hook to key_worker: (key_code, time received)
+key_events = queue.SimpleQueue()
+key_queue_limit = KEY_QUEUE_LIMIT
+key_worker_thread = None
+hook_watchdog = HookWatchdog("keyboard")
+
+def on_hook_degraded(degraded):
+    """ While the hook is slow, stop its logging and keep less backlog. """
+    global key_queue_limit
+    hook_logger.disabled = degraded
+    key_queue_limit = KEY_QUEUE_LIMIT_DEGRADED if degraded else KEY_QUEUE_LIMIT
+
+hook_watchdog.listeners.append(on_hook_degraded)
+
+def reset_menu_iterator(tables):
+    """ Restarts the menu from its first entry when the mappings are reloaded. """
+    global menu_functions_iterator
+    menu_functions_iterator = CircularIterator(tables.button_menu)
+
+key_mappings.listeners.append(reset_menu_iterator)
+
+def queue_cat_command(command: CATCommand, param:str = None, radio=None):
+    # Commands loaded from mappings.toml are plain strings
+    command = getattr(command, "value", command)
+    cmd = command if not param else f"{command}{param};"
+    radios = (radio,) if isinstance(radio, str) else radio
+    if radios is None or cat_command.DEFAULT_RADIO in radios:
+        # Mirror the change right away so the next key press sees it before the send completes
+        radio_state.note_queued(cmd)
+    logger.info("operation=queue_cat_command, queueing CAT cmd: %s", cmd)
+    metrics.inc("key_commands_total", command[:4])
+    if not dispatch_cat_command(cmd, radio):
+        logger.warning("operation=queue_cat_command, dispatcher dropped CAT cmd: %s", cmd)
+
+def get_step_code(radio=None):
+    """ ZZAC code of a radio: the default radio's is mirrored, any other is read from it. """
+    if radio is None or radio == cat_command.DEFAULT_RADIO:
+        return radio_state.get_int("ZZAC")
+    reply = cat_command.query_cat("ZZAC", radio)
+    return parse_frame(reply).number if reply else None
+
+def queue_remote_tune_step(key, tables, radio):
+    """ Steps a non-default radio from its own ZZAC. The read and the send both run on that
+    radio's dispatcher worker, so a slow or dead radio never holds up the key worker. """
+    def resolve():
+        cmd = get_tune_step_cmd(key, tables, radio)
+        if cmd is None:
+            return None
+        cmd = getattr(cmd, "value", cmd)
+        logger.info("operation=queue_remote_tune_step, sending CAT cmd %s to %s", cmd, radio)
+        metrics.inc("key_commands_total", cmd[:4])
+        return cmd
+    if not dispatch_cat_command(resolve, radio):
+        logger.warning("operation=queue_remote_tune_step, dispatcher for %s dropped key %s", radio, key)
+
+def get_tune_step_cmd(key, tables=None, radio=None):
+    tables = tables or key_mappings.current
+    current_step_code = get_step_code(radio)
+
+    if key in tables.keys:
         try:
-            logging.info(f"operation=send_command_in_thread, sending CAT cmd: {command}")
-            cmd = command.value if not param else f"{command.value}{param};"
-            send_cat_command(cmd)
-        except Exception as e:
-            logging.exception(f"operation=send_command_in_thread, error while sending CAT command: {e}")
-
-    thread = threading.Thread(target=run, daemon=True)
-    thread.start()
-
-def get_tune_step_cmd(key):
-    global tune_step_iterator
-    current_value = query_cat(CATCommand.TUNE_STEP_SIZE.value)
-    last_two_digits = int(current_value[-2:])
-
-    if key in suppressed_keys:
-        match suppressed_keys[key]:
-            case {"direction": "down"}:
-                tune_step_iterator.start_from(last_two_digits).next()
-                while True:
-                    next = tune_step_iterator.next()
-                    if next[1]["active"] == True:
-                        show_overlay(f"Step tune {next[1]["step_text"]}")
-                        logging.info(f"operation=get_tune_step_cmd, getting cmd {next[1]["cmd"]} for key {key}")
-                        return next[1]["cmd"]
-
-            case {"direction": "up"}:
-                tune_step_iterator.start_from(last_two_digits).previous()
-                while True:
-                    previous = tune_step_iterator.previous()
-                    if previous[1]["active"] == True:
-                        show_overlay(f"Step tune {previous[1]["step_text"]}")
-                        logging.info(f"operation=get_tune_step_cmd, getting cmd {previous[1]["cmd"]} for key {key}")
-                        return previous[1]["cmd"]
+            match tables.keys[key]:
+                case {"direction": "down"}:
+                    target = tables.tune_steps.next(current_step_code)
+                case {"direction": "up"}:
+                    target = tables.tune_steps.previous(current_step_code)
+                case _:
+                    logger.warning("operation=get_tune_step_cmd, key %s has no step direction", key)
+                    return None
+        except KeyError:
+            # The ZZAC read failed (None) or Thetis reported a code missing from the table
+            logger.warning("operation=get_tune_step_cmd, unknown current step code %s for key %s",
+                           current_step_code, key)
+            return None
+        show_overlay(target.overlay_text)
+        logger.info("operation=get_tune_step_cmd, getting cmd %s for key %s", target.cmd, key)
+        return target.cmd
+
+def set_active_tune_steps(codes):
+    """ Rebuilds the step index with a new active set; the swap is a single assignment. """
+    tables = key_mappings.current
+    key_mappings.swap(tables._replace(tune_steps=tables.tune_steps.with_active(codes)))
 
 def reset_vfo_a_last_three_digits(direction):
     # Retrieve the current frequency of VFO A
-    current_freq_str = query_cat(CATCommand.VFO_A_FREQ.value)
-    
-    # Convert the frequency string to an integer
-    try:
-        current_freq = int(current_freq_str[-11:])
-    except ValueError:
-        logging.exception(f"operation=reset_vfo_a_last_three_digits, Invalid frequency received: {current_freq_str}")
+    current_freq = radio_state.get_int(CATCommand.VFO_A_FREQ.value)
+    if current_freq is None:
+        logger.error("operation=reset_vfo_a_last_three_digits, Invalid frequency received: %s",
+                     radio_state.peek(CATCommand.VFO_A_FREQ.value))
         return False
     
     # Check if the last three digits are '000'
@@ -202,52 +290,88 @@ def reset_vfo_a_last_three_digits(direction):
         # Find the nearest '000' below the current frequency
         new_freq = (current_freq // 1000) * 1000
     else:
-        print(f"Invalid direction: {direction}")
+        logger.error("operation=reset_vfo_a_last_three_digits, Invalid direction: %s", direction)
         return False
     
     # Format the new frequency as a 10-digit string with leading zeros
     new_freq_str = f"{new_freq:011d}"
     
     # Send the new frequency to VFO A
-    send_command_in_thread(CATCommand.VFO_A_FREQ, new_freq_str)
+    queue_cat_command(CATCommand.VFO_A_FREQ, new_freq_str)
     return True
 
 def get_current_tune_step():
-    current_step_code = query_cat(CATCommand.TUNE_STEP_SIZE.value)
     try:
-        current_step_code_int = int(current_step_code[-2:])
+        current_step_code_int = int(radio_state.get("ZZAC"))
     except Exception as e:
-        logging.error(f"operation=win32_event_filter, error converting current_step_code to int {e}")
+        logger.error("operation=get_current_tune_step, error converting current_step_code to int %s", e)
         current_step_code_int = 0
 
-    current_tune_step_value = TUNE_STEPS.get(current_step_code_int)["step"]
+    current_tune_step_value = key_mappings.current.tune_steps.step_size(current_step_code_int)
     return current_tune_step_value
 
+def get_vfo_a_frequency():
+    """ Base for absolute VFO writes; without ZZAI pushes the mirror may miss a VFO turned
+    in Thetis, so it must then be no older than one accumulator window (else re-read). """
+    max_age = None if radio_state.following_pushes else VFO_ACCEL_WINDOW
+    return radio_state.get_int(CATCommand.VFO_A_FREQ.value, max_age)
+
+def send_vfo_a_frequency(frequency):
+    queue_cat_command(CATCommand.VFO_A_FREQ, f"{frequency:011d}")
+
+def send_vfo_a_step(direction, radio=None):
+    queue_cat_command(CATCommand.VFO_A_FREQ_UP if direction > 0 else CATCommand.VFO_A_FREQ_DOWN, radio=radio)
+
+# Folds fast VFO knob spins into a few absolute ZZFA writes
+vfo_a_steps = StepAccumulator(
+    get_frequency=get_vfo_a_frequency,
+    get_step=get_current_tune_step,
+    send_frequency=send_vfo_a_frequency,
+    send_relative=send_vfo_a_step,
+    window=VFO_ACCEL_WINDOW,
+    curve=VFO_ACCELERATION_CURVE,
+)
+
 def dispatch_cmd(key_code):
     global step_has_changed
 
-    keys = suppressed_keys.get(key_code)
+    tables = key_mappings.current
+    keys = tables.keys.get(key_code)
     match keys:
         case {"type": "stepTune"}:
-            cmd = get_tune_step_cmd(key_code)
-            send_command_in_thread(cmd)
-            step_has_changed = True
+            radio = keys.get("radio")
+            radios = (radio,) if radio is None or isinstance(radio, str) else radio
+            if radio is None or cat_command.DEFAULT_RADIO in radios:
+                # Radios stepped together with the default radio follow its mirrored step
+                cmd = get_tune_step_cmd(key_code, tables)
+                if cmd is not None:
+                    queue_cat_command(cmd, radio=radio)
+                    step_has_changed = True
+            else:
+                # Other radios each step from their own current ZZAC
+                for name in radios:
+                    queue_remote_tune_step(key_code, tables, name)
+                step_has_changed = True
+
+        case {"type": "volume", "direction": direction, "radio": radio}:
+            # Only the default radio's frequency is mirrored; step the others relatively
+            send_vfo_a_step(1 if direction == "up" else -1, radio)
 
         case {"type": "volume", "direction": "up"}:
             if step_has_changed:
                 if not reset_vfo_a_last_three_digits("up"):
-                    send_command_in_thread(CATCommand.VFO_A_FREQ_UP)
+                    vfo_a_steps.add(1)
                     step_has_changed = False
             else:
-                send_command_in_thread(CATCommand.VFO_A_FREQ_UP)
+                vfo_a_steps.add(1)
 
         case {"type": "volume", "direction": "down"}:
             if step_has_changed:
                 if not reset_vfo_a_last_three_digits("down"): 
-                    send_command_in_thread(CATCommand.VFO_A_FREQ_DOWN)
+                    vfo_a_steps.add(-1)
                     step_has_changed = False
             else:
-                send_command_in_thread(CATCommand.VFO_A_FREQ_DOWN)
+                vfo_a_steps.add(-1)
 
 def check_menu_toogle_cmd(key_code):
     global menu_toogle
@@ -268,52 +392,75 @@ def check_menu_toogle_cmd(key_code):
 ##################################
 ### pynput functions defenition ##
 ##################################
+def handle_key_event(key_code):
+    """ Everything a key press does, run on key_worker rather than in the hook. """
+    menu_toogle = check_menu_toogle_cmd(key_code)
+    match menu_toogle:
+        case MenuToogle.ON:
+            logger.debug("operation=handle_key_event, menu on")
+            ## on_knob_button_press()
+            # handle_selection("Control VFO A")
+        case MenuToogle.OFF:
+            logger.debug("operation=handle_key_event, menu off")
+
+    keys = key_mappings.current.keys.get(key_code)
+    if keys is not None:
+        start = time.perf_counter()
+        dispatch_cmd(key_code)
+        metrics.observe("key_dispatch_seconds", time.perf_counter() - start, keys["type"])
+
+def key_worker():
+    while True:
+        key_code, received = key_events.get()
+        metrics.observe("key_queue_seconds", time.perf_counter() - received)
+        try:
+            handle_key_event(key_code)
+        except Exception as e:
+            logger.exception("operation=key_worker, key %s failed: %s", key_code, e)
+
+def start_key_worker():
+    global key_worker_thread
+    if key_worker_thread is None:
+        key_worker_thread = threading.Thread(target=key_worker, name="key-worker", daemon=True)
+        key_worker_thread.start()
+
 def win32_event_filter(msg, data):
-    global menu_toogle
+    # Runs inside Windows' low-level keyboard hook: classify, enqueue, suppress, nothing else.
     # Preventing double stroke from the knob controller.
     # Msg comes with 2 values: 256 and 257. Only processing the first, since the second would cause issuing double command.
-    logging.debug(f"Filtering msg={msg}, data={data}")
     if msg == 256:
+        start = time.perf_counter()
+        try:
+            key_code = data.vkCode  # Virtual key code
+            hook_logger.debug("operation=win32_event_filter, key_code: %s", key_code)
+
+            # Check if key should be suppressed
+            if key_code in key_mappings.current.keys:
+                if event_recorder.recorder is not None:
+                    event_recorder.recorder.record_key(key_code)
+                if key_events.qsize() < key_queue_limit:
+                    key_events.put((key_code, start))
+                else:
+                    metrics.inc("key_events_dropped_total")
+                hook_logger.debug("operation=win32_event_filter, suppressing event for key: %s", key_code)
+
+                # Block key globally (raises, so the finally below still times the call)
+                listener.suppress_event()
 
-        logging.debug(f"operation=win32_event_filter, received key event: {msg}, data: {data}")
-
-        key_code = data.vkCode  # Virtual key code
-        logging.info(f"operation=win32_event_filter, key_code: {key_code}")
-        print(menu_toogle)
-        menu_toogle = check_menu_toogle_cmd(key_code)
-        print(menu_toogle)
-        match menu_toogle:
-            case MenuToogle.ON:
-                print("MENU ON")
-                ## on_knob_button_press()
-                # handle_selection("Control VFO A")
-            case MenuToogle.OFF:
-                print("MENU OFF")
-
-        # Check if key should be suppressed
-        if key_code in suppressed_keys:
-            logging.info(f"operation=win32_event_filter, processing msg: {msg}")
-
-            # Use regex to extract the memory address
-            match = re.search(r"0x([0-9A-Fa-f]+)", str(data))
-
-            if match:
-                dispatch_cmd(key_code)
-                logging.debug(f"operation=win32_event_filter, suppressing event for key: {key_code}")
-                
-                # Block key globally
-                listener.suppress_event() 
-                
                 # Do not pass to on_press
                 return False
-            
-        # Allow key event to propagate    
+        finally:
+            hook_watchdog.record(time.perf_counter() - start)
+
+        # Allow key event to propagate
         return True
 
 def start_listener():
     global listener
     global keyboard_controller
-    logging.info("operation=start_listener, initializing listener...")
+    logger.info("operation=start_listener, initializing listener...")
+    key_mappings.start_watching()
+    start_key_worker()
     show_overlay(f"{MenuFunctions.CONTROL_VFO_A}")
     # Start a new listener
     listener = keyboard.Listener(
@@ -324,9 +471,9 @@ def start_listener():
     )
     try:
         listener.start()
-        logging.info("operation=start_listener, listener started successfully")
+        logger.info("operation=start_listener, listener started successfully")
     except Exception as e:
-        logging.exception(f"operation=start_listener, listener failed to start: {e}")
+        logger.exception("operation=start_listener, listener failed to start: %s", e)
 
 def on_press(key):
     return True
@@ -339,15 +486,24 @@ def on_release(key):
 # Start the first listener at the beginning
 # Ensure this block is under __name__ == '__main__':
 if __name__ == "__main__":
+    setup_logging()
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_PORT)
+    metrics.start_summary_logger()
+    event_recorder.start_recording_from_env()
+    prewarm_overlay()
+    radio_state.start()
     start_listener()
 
     try:
         while True:
             if listener and not listener.is_alive():
-                logging.error("operation=main_loop, listener has stopped! Restarting...")
+                logger.error("operation=main_loop, listener has stopped! Restarting...")
                 start_listener()
             time.sleep(1)  # Prevent CPU overuse
     except KeyboardInterrupt:
-        logging.info("operation=main_loop, shutting down due to KeyboardInterrupt")
+        logger.info("operation=main_loop, shutting down due to KeyboardInterrupt")
         if listener:
-            listener.stop()
\ No newline at end of file
+            listener.stop()
+        shutdown_dispatchers()
+        event_recorder.stop_recording()
\ No newline at end of file